@@ -1,13 +1,22 @@
-import urllib.request
-import xml.etree.ElementTree as ET
+import argparse
+import contextlib
+import functools
+import hashlib
+import itertools
+import urllib.parse
 import re
 import math
 import os
 import json
-import subprocess
+import random
 import shutil
+import signal
+import struct
 import sys
+import threading
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 
 class Color:
@@ -23,6 +32,736 @@ class Color:
     YELLOW = "\033[93m"
 
 
+class Config:
+    MAX_RETRIES = 5
+    TIMEOUT = 10
+    MIN_TIMEOUT = 2
+    TIMEOUT_FACTOR = 4
+    RETRY_BASE_DELAY = 0.5
+    RETRY_MAX_DELAY = 10
+    RETRY_BUDGET = 30
+    LATENCY_WINDOW = 200
+    LATENCY_MIN_SAMPLES = 10
+    HEDGE_PERCENTILE = 0
+    HEDGE_CHUNK_SIZE = 64 * 1024
+    SEGMENT_WORKERS = 4
+    BUFFERED_SEGMENTS = 16
+    STREAM_MUX = True
+    MUXER = "auto"
+    CHECKPOINT_BYTES = 4 * 1024 * 1024
+    POOL_SIZE = 8
+    MAX_REDIRECTS = 5
+    USER_AGENT = "Mozilla/5.0"
+    API_URL = "https://api-media.3cat.cat/pvideo/media.jsp"
+    SHOW_PROGRESS = True
+    PROGRESS_INTERVAL = 0.25
+    PROGRESS_LOG_INTERVAL = 10
+    PROGRESS_BARS = 8
+    CACHE_TTL = 3600
+    CACHE_ENTRIES = 256
+    CACHE_DIR = None
+    RANGE_CONNECTIONS = 4
+    RANGE_CHUNK = 8 * 1024 * 1024
+    HASH_BUFFER = 64 * 1024 * 1024
+    BLOCK_SIZE = 1024 * 1024
+    SUBTITLE_WORKERS = 4
+    METADATA_WORKERS = 8
+    HOST_JOBS = 2
+    MAX_PAGES = 50
+    LIBRARY_PATH = None
+    LIBRARY_ENV = "TRESCAT_LIBRARY"
+    DEFAULT_LIBRARY_PATH = os.path.join(
+        os.path.expanduser("~"), ".3cat_media_downloader", "library.sqlite3"
+    )
+    LIBRARY_VERIFY = False
+    MAX_BANDWIDTH = 0
+    TARGET_TIME = None
+    PROBE_SEGMENTS = 3
+    PROBE_BYTES = 2 * 1024 * 1024
+    PROBE_TTL = 600
+    SEGMENT_CACHE_DIR = None
+    SEGMENT_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+    INTEGRITY_MANIFEST = True
+    DAEMON_PATH = os.path.join(
+        os.path.expanduser("~"), ".3cat_media_downloader", "daemon.sqlite3"
+    )
+
+
+class DownloadError(Exception):
+    pass
+
+
+class RangesUnsupported(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class PooledResponse:
+    def __init__(self, pool, key, conn, response, url):
+        self.pool = pool
+        self.key = key
+        self.conn = conn
+        self.response = response
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.url = url
+
+    def info(self):
+        return self.headers
+
+    def read(self, amt=None):
+        return self.response.read(amt)
+
+    def readinto(self, buffer):
+        return self.response.readinto(buffer)
+
+    def readline(self, limit=-1):
+        return self.response.readline(limit)
+
+    def close(self):
+        if self.conn is None:
+            return
+        if self.response.isclosed() and not self.response.will_close:
+            self.pool.release(self.key, self.conn)
+        else:
+            self.response.close()
+            self.conn.close()
+        self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.ssl_context = None
+        self.proxies = None
+        self.routes = {}
+        self.stats = {"created": 0, "reused": 0, "requests": 0}
+
+    def route(self, scheme, host):
+        if (scheme, host) in self.routes:
+            return self.routes[scheme, host]
+
+        import urllib.request
+
+        if self.proxies is None:
+            self.proxies = urllib.request.getproxies()
+        proxy = self.proxies.get(scheme)
+        route = None
+        if proxy and not urllib.request.proxy_bypass(host):
+            if "://" not in proxy:
+                proxy = "http://" + proxy
+            parts = urllib.parse.urlsplit(proxy)
+            headers = {}
+            if parts.username is not None:
+                import base64
+
+                credentials = f"{urllib.parse.unquote(parts.username)}:{urllib.parse.unquote(parts.password or '')}"
+                headers["Proxy-Authorization"] = (
+                    "Basic " + base64.b64encode(credentials.encode()).decode()
+                )
+            route = (parts.hostname, parts.port or 80, headers)
+        self.routes[scheme, host] = route
+        return route
+
+    def acquire(self, key, timeout):
+        with self.lock:
+            conns = self.idle.get(key)
+            if conns:
+                conn = conns.pop()
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+
+        import http.client
+
+        scheme, host, port = key
+        proxy = self.route(scheme, host)
+        conn_host, conn_port = proxy[:2] if proxy else (host, port)
+        if scheme == "https":
+            if self.ssl_context is None:
+                import ssl
+
+                self.ssl_context = ssl.create_default_context()
+            conn = http.client.HTTPSConnection(
+                conn_host, conn_port, timeout=timeout, context=self.ssl_context
+            )
+            if proxy:
+                conn.set_tunnel(host, port, headers=proxy[2])
+        else:
+            conn = http.client.HTTPConnection(conn_host, conn_port, timeout=timeout)
+        return conn, False
+
+    def release(self, key, conn):
+        with self.lock:
+            conns = self.idle.setdefault(key, [])
+            if len(conns) < self.size:
+                conns.append(conn)
+                return
+        conn.close()
+
+    def request(self, key, method, path, headers, timeout):
+        import http.client
+
+        while True:
+            conn, reused = self.acquire(key, timeout)
+            try:
+                conn.request(method, path, headers=headers)
+                response = conn.getresponse()
+            except (
+                http.client.RemoteDisconnected,
+                ConnectionResetError,
+                BrokenPipeError,
+            ):
+                conn.close()
+                if reused:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            with self.lock:
+                self.stats["requests"] += 1
+                self.stats["reused" if reused else "created"] += 1
+            return conn, response
+
+    def open(self, url, headers=None, timeout=None, method="GET"):
+        all_headers = {"User-Agent": Config.USER_AGENT}
+        all_headers.update(headers or {})
+        timeout = timeout or Config.TIMEOUT
+
+        for _ in range(Config.MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            default_port = 443 if parts.scheme == "https" else 80
+            key = (parts.scheme, parts.hostname, parts.port or default_port)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+
+            request_headers = all_headers
+            proxy = parts.scheme == "http" and self.route(parts.scheme, parts.hostname)
+            if proxy:
+                path = f"http://{parts.netloc}{path}"
+                request_headers = dict(all_headers, **proxy[2])
+
+            conn, response = self.request(key, method, path, request_headers, timeout)
+            pooled = PooledResponse(self, key, conn, response, url)
+
+            location = response.getheader("Location")
+            if response.status in (301, 302, 303, 307, 308) and location:
+                response.read()
+                pooled.close()
+                url = urllib.parse.urljoin(url, location)
+                continue
+
+            if response.status >= 400:
+                from urllib.error import HTTPError
+
+                response.read()
+                pooled.close()
+                raise HTTPError(
+                    url, response.status, response.reason, response.headers, None
+                )
+
+            return pooled
+
+        raise Exception("Massa redireccions.")
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for conn in conns:
+                    conn.close()
+            self.idle.clear()
+
+
+HTTP_POOL = ConnectionPool(Config.POOL_SIZE)
+
+
+def http_open(url, headers=None, timeout=None, method="GET"):
+    return HTTP_POOL.open(url, headers, timeout, method)
+
+
+def print_pool_stats():
+    stats = HTTP_POOL.stats
+    print(
+        f"   {Color.GRAY}Connexions HTTP: {stats['created']} noves, {stats['reused']} reutilitzades ({stats['requests']} peticions).{Color.END}"
+    )
+
+
+class MetadataCache:
+    def __init__(self, ttl, max_entries, cache_dir=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def path(self, key):
+        return os.path.join(
+            self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    return entry[1]
+                del self.entries[key]
+
+        if not self.cache_dir:
+            return None
+
+        path = self.path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("key") != key or entry.get("expires", 0) <= now:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return None
+
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        self.remember(key, entry["expires"], entry["value"])
+        return entry["value"]
+
+    def remember(self, key, expires, value):
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl
+        self.remember(key, expires, value)
+
+        if not self.cache_dir:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "expires": expires, "value": value}, f)
+        os.replace(tmp_path, path)
+        self.evict_disk()
+
+    def evict_disk(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.cache_dir, name)
+                with contextlib.suppress(OSError):
+                    files.append((os.path.getmtime(path), path))
+
+        files.sort()
+        for _, path in files[: max(0, len(files) - self.max_entries)]:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
+
+METADATA_CACHE = MetadataCache(Config.CACHE_TTL, Config.CACHE_ENTRIES, Config.CACHE_DIR)
+
+
+class SegmentCache:
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = None
+        self.total = 0
+
+    def path(self, url):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".seg")
+
+    def load(self):
+        if self.entries is not None:
+            return
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".seg"):
+                    path = os.path.join(root, name)
+                    with contextlib.suppress(OSError):
+                        stat = os.stat(path)
+                        files.append((stat.st_mtime, path, stat.st_size))
+        files.sort()
+        self.entries = OrderedDict((path, size) for _, path, size in files)
+        self.total = sum(self.entries.values())
+
+    def get(self, url):
+        if not self.cache_dir:
+            return None
+        path = self.path(url)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        with self.lock:
+            self.load()
+            if path in self.entries:
+                self.entries.move_to_end(path)
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return data
+
+    def put(self, url, data):
+        if not self.cache_dir or len(data) > self.max_bytes:
+            return
+        path = self.path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            return
+
+        with self.lock:
+            self.load()
+            self.total -= self.entries.pop(path, 0)
+            self.entries[path] = len(data)
+            self.total += len(data)
+            while self.total > self.max_bytes and self.entries:
+                old_path, size = self.entries.popitem(last=False)
+                self.total -= size
+                with contextlib.suppress(OSError):
+                    os.remove(old_path)
+
+
+SEGMENT_CACHE = SegmentCache(Config.SEGMENT_CACHE_DIR, Config.SEGMENT_CACHE_SIZE)
+
+
+class EventLog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stream = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.hosts = {}
+            self.transfers = []
+            self.mux_seconds = []
+            self.cache = {"hits": 0, "bytes": 0}
+
+    def open(self, path):
+        self.close()
+        if path == "-":
+            self.stream = sys.stderr
+        elif path:
+            self.stream = open(path, "a", encoding="utf-8")
+
+    def close(self):
+        if self.stream is not None and self.stream is not sys.stderr:
+            self.stream.close()
+        self.stream = None
+
+    def host_stats(self, url):
+        host = urllib.parse.urlsplit(url).hostname or "?"
+        stats = self.hosts.get(host)
+        if stats is None:
+            stats = self.hosts[host] = {
+                "requests": 0,
+                "bytes": 0,
+                "retries": 0,
+                "latency_total": 0.0,
+                "latency_max": 0.0,
+                "latencies": deque(maxlen=Config.LATENCY_WINDOW),
+            }
+        return stats
+
+    def emit(self, event, **fields):
+        record = {"ts": round(time.time(), 3), "event": event}
+        record.update(fields)
+
+        with self.lock:
+            if event in ("segment", "range", "stream"):
+                stats = self.host_stats(fields["url"])
+                stats["requests"] += 1
+                stats["bytes"] += fields["bytes"]
+                stats["latency_total"] += fields["latency"]
+                stats["latency_max"] = max(stats["latency_max"], fields["latency"])
+                stats["latencies"].append(fields["latency"])
+            elif event == "retry":
+                self.host_stats(fields["url"])["retries"] += 1
+            elif event in ("track", "file"):
+                self.transfers.append(
+                    {
+                        "name": fields["name"],
+                        "bytes": fields["bytes"],
+                        "seconds": fields["seconds"],
+                    }
+                )
+            elif event == "mux":
+                self.mux_seconds.append(fields["seconds"])
+            elif event == "cache":
+                self.cache["hits"] += 1
+                self.cache["bytes"] += fields["bytes"]
+
+            if self.stream is not None:
+                self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self.stream.flush()
+
+    def summary(self):
+        with self.lock:
+            hosts = {}
+            for host, stats in self.hosts.items():
+                latencies = sorted(stats["latencies"])
+                hosts[host] = {
+                    "requests": stats["requests"],
+                    "bytes": stats["bytes"],
+                    "retries": stats["retries"],
+                    "latency_avg": round(
+                        stats["latency_total"] / max(1, stats["requests"]), 4
+                    ),
+                    "latency_p95": (
+                        round(latencies[int(len(latencies) * 0.95)], 4)
+                        if latencies
+                        else 0
+                    ),
+                    "latency_max": round(stats["latency_max"], 4),
+                }
+            return {
+                "hosts": hosts,
+                "transfers": list(self.transfers),
+                "mux_seconds": list(self.mux_seconds),
+                "cache": dict(self.cache),
+            }
+
+
+EVENTS = EventLog()
+
+
+class PhaseProfiler:
+    def __init__(self):
+        self.output_dir = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.phases = {}
+
+    def enable(self, output_dir):
+        import tracemalloc
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        tracemalloc.start()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        import cProfile
+        import tracemalloc
+
+        stack = self.local.__dict__.setdefault("stack", [])
+        if stack and stack[-1]:
+            stack[-1].disable()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            profile = None
+        stack.append(profile)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            stack.pop()
+            if stack and stack[-1]:
+                stack[-1].enable()
+            self.add(
+                name,
+                profile,
+                time.perf_counter() - started,
+                time.process_time() - cpu_started,
+                tracemalloc.get_traced_memory()[1] - memory,
+            )
+
+    def add(self, name, profile, seconds, cpu_seconds, peak):
+        import pstats
+
+        with self.lock:
+            entry = self.phases.get(name)
+            if entry is None:
+                entry = self.phases[name] = {
+                    "calls": 0,
+                    "seconds": 0.0,
+                    "cpu_seconds": 0.0,
+                    "peak_bytes": 0,
+                    "unprofiled_calls": 0,
+                    "stats": None,
+                }
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["cpu_seconds"] += cpu_seconds
+            entry["peak_bytes"] = max(entry["peak_bytes"], peak)
+            if profile is None:
+                entry["unprofiled_calls"] += 1
+                return
+            if entry["stats"] is None:
+                entry["stats"] = pstats.Stats(profile)
+            else:
+                entry["stats"].add(profile)
+
+    def save(self):
+        if not self.output_dir:
+            return
+        summary = {}
+        for name, entry in sorted(self.phases.items()):
+            if entry["stats"] is not None:
+                entry["stats"].dump_stats(os.path.join(self.output_dir, f"{name}.prof"))
+            summary[name] = {
+                "calls": entry["calls"],
+                "seconds": round(entry["seconds"], 4),
+                "cpu_seconds": round(entry["cpu_seconds"], 4),
+                "peak_mib": round(entry["peak_bytes"] / 1048576, 2),
+                "unprofiled_calls": entry["unprofiled_calls"],
+            }
+        with open(
+            os.path.join(self.output_dir, "profile.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump(summary, f, indent=2)
+
+        print(f"\n{Color.BOLD}   Perfil per fases:{Color.END}")
+        for name, entry in summary.items():
+            print(
+                f"   {Color.GRAY}{name:<10} {entry['calls']:>4} crides, {entry['seconds']:.2f} s, CPU {entry['cpu_seconds']:.2f} s, pic {entry['peak_mib']:.1f} MiB{Color.END}"
+            )
+            if entry["unprofiled_calls"]:
+                print(
+                    f"   {Color.YELLOW}{'':<10} {entry['unprofiled_calls']:>4} crides sense perfil (coincidien amb una altra fase en un altre fil).{Color.END}"
+                )
+        print(
+            f"   {Color.GRAY}Perfils desats a {self.output_dir} (python -m pstats FITXER.prof).{Color.END}"
+        )
+
+
+PROFILER = PhaseProfiler()
+
+
+def profiled(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.output_dir:
+                return func(*args, **kwargs)
+            with PROFILER.phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def print_metrics_summary(summary):
+    for host, stats in summary["hosts"].items():
+        print(
+            f"   {Color.GRAY}{host}: {stats['requests']} peticions, {stats['bytes'] / 1048576:.1f} MB, "
+            f"latència mitjana {stats['latency_avg'] * 1000:.0f} ms (p95 {stats['latency_p95'] * 1000:.0f} ms), "
+            f"{stats['retries']} reintents.{Color.END}"
+        )
+    if summary["cache"]["hits"]:
+        print(
+            f"   {Color.GRAY}Memòria cau de segments: {summary['cache']['hits']} segments, {summary['cache']['bytes'] / 1048576:.1f} MB estalviats.{Color.END}"
+        )
+    if summary["mux_seconds"]:
+        print(
+            f"   {Color.GRAY}Temps de fusió: {sum(summary['mux_seconds']):.1f} s.{Color.END}"
+        )
+
+
+class RetryPolicy:
+    def __init__(self, budget=None, cancelled=None):
+        self.lock = threading.Lock()
+        self.budget = Config.RETRY_BUDGET if budget is None else budget
+        self.cancelled = cancelled or threading.Event()
+        self.latencies = {}
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise JobCancelled("Descàrrega cancel·lada.")
+
+    def record(self, key, latency):
+        with self.lock:
+            samples = self.latencies.get(key)
+            if samples is None:
+                samples = self.latencies[key] = deque(maxlen=Config.LATENCY_WINDOW)
+            samples.append(latency)
+
+    def percentile(self, key, fraction):
+        with self.lock:
+            samples = sorted(self.latencies.get(key, ()))
+        if len(samples) < Config.LATENCY_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+    def timeout(self, key):
+        p95 = self.percentile(key, 0.95)
+        if p95 is None:
+            return Config.TIMEOUT
+        return min(Config.TIMEOUT, max(Config.MIN_TIMEOUT, p95 * Config.TIMEOUT_FACTOR))
+
+    def hedge_after(self, key):
+        if not Config.HEDGE_PERCENTILE:
+            return None
+        return self.percentile(key, Config.HEDGE_PERCENTILE)
+
+    def spend(self):
+        with self.lock:
+            if self.budget <= 0:
+                return False
+            self.budget -= 1
+            return True
+
+    def retry(self, attempt, error):
+        from urllib.error import HTTPError
+
+        if attempt >= Config.MAX_RETRIES - 1 or isinstance(error, JobCancelled):
+            return False
+        if (
+            isinstance(error, HTTPError)
+            and 400 <= error.code < 500
+            and error.code not in (408, 429)
+        ):
+            return False
+
+        if not self.spend():
+            return False
+        ceiling = min(Config.RETRY_MAX_DELAY, Config.RETRY_BASE_DELAY * 2**attempt)
+        return not self.cancelled.wait(random.uniform(0, ceiling))
+
+
 def get_quality_label(width, height, original_label=None):
     qualities = {
         "7680x4320": "8K Ultra HD",
@@ -60,7 +799,10 @@ def get_terminal_width():
 
 
 def clear_screen():
-    os.system("cls" if os.name == "nt" else "clear")
+    if os.name == "nt":
+        os.system("cls")
+    elif sys.stdout.isatty():
+        print("\033[H\033[2J", end="", flush=True)
 
 
 def print_header():
@@ -88,17 +830,20 @@ def print_header():
 
     print(f"{Color.GRAY}{'━' * width}{Color.END}")
 
-    ffmpeg_available = shutil.which("ffmpeg") is not None
+    ffmpeg_available = check_ffmpeg()
     status_label = "FFmpeg: "
-    status_value = (
-        "Disponible"
-        if ffmpeg_available
-        else "No trobat. Descàrregues de vídeos DASH desactivades."
-    )
+    if ffmpeg_available:
+        status_value = "Disponible"
+        status_color = Color.GREEN
+    elif Config.MUXER != "ffmpeg":
+        status_value = "No trobat. Els vídeos DASH es combinen internament."
+        status_color = Color.YELLOW
+    else:
+        status_value = "No trobat. Descàrregues de vídeos DASH desactivades."
+        status_color = Color.RED
 
     total_status_len = len(status_label) + len(status_value)
     status_padding = (width - total_status_len) // 2
-    status_color = Color.GREEN if ffmpeg_available else Color.RED
 
     print(
         f"{' ' * status_padding}{Color.BOLD}{status_label}{status_color}{status_value}{Color.END}"
@@ -127,10 +872,12 @@ def print_exit_message():
     print(f"{Color.GRAY}{'━' * width}{Color.END}\n")
 
 
+@functools.lru_cache(maxsize=None)
 def check_ffmpeg():
     return shutil.which("ffmpeg") is not None
 
 
+@profiled("metadata")
 def get_media_data(web_url):
     is_audio = "/audio/" in web_url
     media_type = "audio" if is_audio else "video"
@@ -140,415 +887,3416 @@ def get_media_data(web_url):
         raise Exception("URL no vàlida. No s'ha trobat l'ID.")
     media_id = match.group(1)
 
-    api_url = f"https://api-media.3cat.cat/pvideo/media.jsp?media={media_type}&versio=vast&idint={media_id}&profile=pc_3cat&format=dm"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    req = urllib.request.Request(api_url, headers=headers)
+    cache_key = f"api:{media_type}:{media_id}"
+    cached = METADATA_CACHE.get(cache_key)
+    if cached is not None:
+        return tuple(cached)
 
-    with urllib.request.urlopen(req) as response:
+    api_url = f"{Config.API_URL}?media={media_type}&versio=vast&idint={media_id}&profile=pc_3cat&format=dm"
+    with http_open(api_url) as response:
         data = json.loads(response.read().decode("utf-8"))
-        info = data.get("informacio", {})
-        titol = info.get("titol", f"{media_type}_{media_id}")
-        titol = re.sub(r"[^\w\s-]", "", titol).strip()
-        duracion_seg = info.get("durada", {}).get("milisegons", 0) / 1000
 
-        sources = data.get("media", {}).get("url", [])
-        if isinstance(sources, str):
-            sources = [{"file": sources, "label": "MP3"}]
+    info = data.get("informacio", {})
+    titol = info.get("titol", f"{media_type}_{media_id}")
+    titol = re.sub(r"[^\w\s-]", "", titol).strip()
+    duracion_seg = info.get("durada", {}).get("milisegons", 0) / 1000
+    data_emissio = info.get("data_emissio", {})
+    if isinstance(data_emissio, dict):
+        data_emissio = data_emissio.get("utc") or data_emissio.get("text") or ""
 
-        variants = data.get("variants", [])
-        subtitols = data.get("subtitols", [])
+    sources = data.get("media", {}).get("url", [])
+    if isinstance(sources, str):
+        sources = [{"file": sources, "label": "MP3"}]
 
-        return media_id, titol, duracion_seg, sources, subtitols, variants, media_type
+    variants = data.get("variants", [])
+    subtitols = data.get("subtitols", [])
 
+    result = (
+        media_id,
+        titol,
+        duracion_seg,
+        sources,
+        subtitols,
+        variants,
+        media_type,
+        data_emissio,
+    )
+    METADATA_CACHE.set(cache_key, list(result))
+    return result
 
-def download_segments(base_url, template_node, total_duration, temp_filename):
-    media_pattern = template_node.get("media")
-    init_path = template_node.get("initialization")
-    duration = int(template_node.get("duration"))
-    timescale = int(template_node.get("timescale"))
 
-    total_segments = math.ceil(total_duration / (duration / timescale))
-    MAX_RETRIES = 3
-    TIMEOUT = 10
+MPD_NS = {"dash": "urn:mpeg:dash:schema:mpd:2011"}
+TEMPLATE_PATTERN = re.compile(r"\$(\w*)(%0\d+d)?\$")
 
-    print(f"\n{Color.YELLOW}   [*] Descarregant segments: {temp_filename}{Color.END}")
 
-    try:
-        with open(temp_filename, "wb") as out_file:
-            init_url = base_url + init_path
-            success_init = False
-            for attempt in range(MAX_RETRIES):
-                try:
-                    with urllib.request.urlopen(init_url, timeout=TIMEOUT) as resp:
-                        out_file.write(resp.read())
-                        success_init = True
-                        break
-                except Exception:
-                    if attempt < MAX_RETRIES - 1:
-                        time.sleep(3)
-
-            if not success_init:
-                raise Exception("No s'ha pogut descarregar la capçalera.")
-
-            for i in range(total_segments):
-                seg_url = base_url + media_pattern.replace("$Number$", str(i))
-                success_seg = False
-
-                for attempt in range(MAX_RETRIES):
-                    try:
-                        with urllib.request.urlopen(seg_url, timeout=TIMEOUT) as resp:
-                            out_file.write(resp.read())
-                            success_seg = True
-                            break
-                    except Exception as e:
-                        current_attempt = attempt + 1
-                        print(
-                            f"\r\033[K{Color.RED}       [!] Tall detectat al segment {i}. Intent {current_attempt}/{MAX_RETRIES}...{Color.END}",
-                            end="",
-                        )
-                        sys.stdout.flush()
-
-                        if attempt < MAX_RETRIES - 1:
-                            time.sleep(3)
-                        else:
-                            print()
-                            raise Exception(
-                                f"Connexió perduda descarregant el segment {i}: {e}\n"
-                            )
-
-                if success_seg:
-                    prog = ((i + 1) / total_segments) * 100
-                    bar_size = 30
-                    filled = int(prog / 100 * bar_size)
-                    bar = "█" * filled + "░" * (bar_size - filled)
-                    print(f"\r\033[K       |{bar}| {prog:.1f}%", end="")
-                    sys.stdout.flush()
+def parse_iso_duration(value):
+    match = re.fullmatch(
+        r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?)?", value or ""
+    )
+    if not match or not value:
+        return None
+    days, hours, minutes, seconds = match.groups()
+    return (
+        int(days or 0) * 86400
+        + int(hours or 0) * 3600
+        + int(minutes or 0) * 60
+        + float(seconds or 0)
+    )
 
-        print(f"\n       {Color.GREEN}✔ Segments completats.{Color.END}")
 
-    except Exception as e:
-        print(f"\n{Color.RED}   [!] Error: {e}{Color.END}")
-        if "out_file" in locals() and not out_file.closed:
-            out_file.close()
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
-        sys.exit(1)
+def fill_template(pattern, values):
+    def replace(match):
+        name, width = match.groups()
+        if not name:
+            return "$"
+        if name not in values:
+            return match.group(0)
+        return width % values[name] if width else str(values[name])
 
+    return TEMPLATE_PATTERN.sub(replace, pattern)
 
-def download_file(url, filename):
-    MAX_RETRIES = 3
-    TIMEOUT = 10
-    print(f"\n{Color.YELLOW}   [*] Descarregant fitxer: {filename}{Color.END}")
 
-    for attempt in range(MAX_RETRIES):
-        try:
-            req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
-            with urllib.request.urlopen(req, timeout=TIMEOUT) as response:
-                total_size = int(response.info().get("Content-Length", 0))
-                downloaded = 0
-                block_size = 8192
+def resolve_base_url(base_url, node):
+    base = node.find("dash:BaseURL", MPD_NS)
+    if base is not None and base.text:
+        return urllib.parse.urljoin(base_url, base.text.strip())
+    return base_url
 
-                with open(filename, "wb") as out_file:
-                    while True:
-                        buffer = response.read(block_size)
-                        if not buffer:
-                            break
 
-                        downloaded += len(buffer)
-                        out_file.write(buffer)
+def merge_template(*nodes):
+    attrib = {}
+    timeline = None
+    for node in nodes:
+        template = node.find("dash:SegmentTemplate", MPD_NS)
+        if template is None:
+            continue
+        attrib.update(template.attrib)
+        node_timeline = template.find("dash:SegmentTimeline", MPD_NS)
+        if node_timeline is not None:
+            timeline = node_timeline
+    return attrib, timeline
 
-                        if total_size > 0:
-                            prog = (downloaded / total_size) * 100
-                            bar_size = 30
-                            filled = int(prog / 100 * bar_size)
-                            bar = "█" * filled + "░" * (bar_size - filled)
-                            print(f"\r\033[K       |{bar}| {prog:.1f}%", end="")
-                            sys.stdout.flush()
 
-                print(f"\n       {Color.GREEN}✔ Descàrrega completada.{Color.END}")
-                return
+def parse_timeline(timeline, timescale, period_duration):
+    entries = []
+    current = 0
+    s_nodes = timeline.findall("dash:S", MPD_NS)
+    for i, s in enumerate(s_nodes):
+        current = int(s.get("t", current))
+        duration = int(s.get("d"))
+        repeat = int(s.get("r", 0))
+        if repeat < 0:
+            if i + 1 < len(s_nodes) and s_nodes[i + 1].get("t") is not None:
+                end = int(s_nodes[i + 1].get("t"))
+            elif period_duration:
+                end = period_duration * timescale
+            else:
+                raise Exception("No es pot calcular la durada del SegmentTimeline.")
+            repeat = math.ceil((end - current) / duration - 1e-6) - 1
+        entries.append([current, duration, repeat])
+        current += duration * (repeat + 1)
+    return entries
 
-        except Exception as e:
-            current_attempt = attempt + 1
-            print(
-                f"\r\033[K{Color.RED}       [!] Tall detectat. Intent {current_attempt}/{MAX_RETRIES}...{Color.END}",
-                end="",
-            )
-            sys.stdout.flush()
 
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(3)
-            else:
-                print(
-                    f"\n\n{Color.RED}   [!] Error: Connexió perduda ({e}).{Color.END}\n"
+def parse_manifest(xml_data, mpd_url=""):
+    import xml.etree.ElementTree as ET
+
+    root = ET.fromstring(xml_data)
+    mpd_base = resolve_base_url(mpd_url, root)
+    mpd_duration = parse_iso_duration(root.get("mediaPresentationDuration"))
+
+    manifest = {"video": [], "audio": []}
+    for period in root.findall("dash:Period", MPD_NS)[:1]:
+        period_base = resolve_base_url(mpd_base, period)
+        period_duration = parse_iso_duration(period.get("duration")) or mpd_duration
+
+        for adaptation in period.findall("dash:AdaptationSet", MPD_NS):
+            set_base = resolve_base_url(period_base, adaptation)
+            for rep in adaptation.findall("dash:Representation", MPD_NS):
+                mime = rep.get("mimeType") or adaptation.get("mimeType") or ""
+                kind = adaptation.get("contentType") or mime.split("/")[0]
+                if kind not in manifest:
+                    continue
+
+                attrib, timeline = merge_template(period, adaptation, rep)
+                if not attrib.get("media"):
+                    continue
+
+                values = {
+                    "RepresentationID": rep.get("id"),
+                    "Bandwidth": int(rep.get("bandwidth") or 0),
+                }
+                rep_base = resolve_base_url(set_base, rep)
+                timescale = int(attrib.get("timescale", 1))
+                init = attrib.get("initialization")
+                manifest[kind].append(
+                    {
+                        "id": rep.get("id"),
+                        "width": rep.get("width") or adaptation.get("width"),
+                        "height": rep.get("height") or adaptation.get("height"),
+                        "bandwidth": values["Bandwidth"],
+                        "init": (
+                            urllib.parse.urljoin(rep_base, fill_template(init, values))
+                            if init
+                            else None
+                        ),
+                        "media": urllib.parse.urljoin(
+                            rep_base, fill_template(attrib["media"], values)
+                        ),
+                        "start_number": int(attrib.get("startNumber", 0)),
+                        "timescale": timescale,
+                        "duration": (
+                            int(attrib["duration"]) if "duration" in attrib else None
+                        ),
+                        "timeline": (
+                            parse_timeline(timeline, timescale, period_duration)
+                            if timeline is not None
+                            else None
+                        ),
+                        "period": period_duration,
+                    }
                 )
-                if os.path.exists(filename):
-                    os.remove(filename)
-                sys.exit(1)
+    return manifest
+
+
+def segment_urls(rep, total_duration=0):
+    number = rep["start_number"]
+    urls = []
+    if rep["timeline"] is not None:
+        for start, duration, repeat in rep["timeline"]:
+            for i in range(repeat + 1):
+                values = {"Number": number, "Time": start + i * duration}
+                urls.append(fill_template(rep["media"], values))
+                number += 1
+    elif rep["duration"]:
+        period = rep["period"] or total_duration
+        count = math.ceil(period * rep["timescale"] / rep["duration"] - 1e-6)
+        for i in range(count):
+            values = {"Number": number + i, "Time": i * rep["duration"]}
+            urls.append(fill_template(rep["media"], values))
+    else:
+        raise Exception("El manifest DASH no indica la durada dels segments.")
+    return rep["init"], urls
+
 
+@profiled("manifest")
+def get_manifest(mpd_url):
+    cache_key = f"manifest:{mpd_url}"
+    manifest = METADATA_CACHE.get(cache_key)
+    if manifest is None:
+        with http_open(mpd_url) as response:
+            manifest = parse_manifest(response.read(), response.url)
+        METADATA_CACHE.set(cache_key, manifest)
+    return manifest
 
-def vtt_to_srt(vtt_path):
-    srt_path = vtt_path.replace(".vtt", ".srt")
+
+def load_checkpoint(path):
     try:
-        with open(vtt_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        final_srt = []
-        counter = 1
-        for i in range(len(lines)):
-            line = lines[i].strip()
-            if " --> " in line:
-                t = re.findall(r"(\d{0,2}:?\d{2}:\d{2}[\.,]\d{3})", line)
-                if len(t) >= 2:
-                    start, end = t[0].replace(".", ","), t[1].replace(".", ",")
-                    if start.count(":") == 1:
-                        start = f"00:{start}"
-                    if end.count(":") == 1:
-                        end = f"00:{end}"
-
-                    text_lines = []
-                    for j in range(i + 1, min(i + 4, len(lines))):
-                        nxt = lines[j].strip()
-                        if not nxt or " --> " in nxt or nxt.startswith("Region:"):
-                            break
-                        clean = re.sub(r"<[^>]+>", "", nxt)
-                        if clean and not clean.isdigit():
-                            text_lines.append(clean)
-
-                    if text_lines:
-                        final_srt.append(
-                            f"{counter}\n{start} --> {end}\n"
-                            + "\n".join(text_lines)
-                            + "\n\n"
-                        )
-                        counter += 1
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-        if final_srt:
-            with open(srt_path, "w", encoding="utf-8", newline="\n") as f:
-                f.writelines(final_srt)
-            if os.path.exists(vtt_path):
-                os.remove(vtt_path)
-            print(
-                f"       {Color.GREEN}✔ Subtítols SRT generats correctament.{Color.END}"
-            )
-            return True
-        return False
-    except Exception:
-        return False
 
+def save_checkpoint(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
 
-def main():
-    ffmpeg_disponible = check_ffmpeg()
 
-    while True:
-        print_header()
+def remove_checkpoint(path):
+    if os.path.exists(path):
+        os.remove(path)
 
-        print(
-            f"   {Color.BOLD}Introduïu la URL del contingut (o 's' per sortir):{Color.END}"
-        )
-        web_url = input(f"\n   {Color.GREEN}URL > {Color.END}").strip()
 
-        if web_url.lower() == "s":
-            print_exit_message()
-            break
-        if not web_url:
-            continue
+def has_checkpoint(filename):
+    return os.path.exists(filename) and os.path.exists(filename + ".part")
 
-        try:
-            media_id, titol, total_sec, sources, subtitols, variants, m_type = (
-                get_media_data(web_url)
-            )
 
-            while True:
-                print_header()
-                print(
-                    f"   {Color.BOLD}Contingut:{Color.END} {Color.YELLOW}{titol}{Color.END}"
-                )
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(math.ceil(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
 
-                available_options = []
-                for s in sources:
-                    if s.get("label") == "DASH":
-                        mpd_url = s.get("file")
-                        xml_data = urllib.request.urlopen(mpd_url).read()
-                        root = ET.fromstring(xml_data)
-                        ns = {"dash": "urn:mpeg:dash:schema:mpd:2011"}
-
-                        if ffmpeg_disponible:
-                            videos = root.findall(
-                                './/dash:AdaptationSet[@mimeType="video/mp4"]/dash:Representation',
-                                ns,
-                            )
-                            for v in videos:
-                                q_label = get_quality_label(
-                                    v.get("width"), v.get("height")
-                                )
-                                available_options.append(
-                                    {
-                                        "type": "DASH_VIDEO",
-                                        "label": f"Vídeo - {q_label}",
-                                        "tag": f"{Color.CYAN}[Descàrrega DASH]{Color.END}",
-                                        "url": mpd_url,
-                                        "v_rep": v,
-                                        "root": root,
-                                        "ns": ns,
-                                    }
-                                )
-
-                        a_rep = root.find(
-                            './/dash:AdaptationSet[@mimeType="audio/mp4"]/dash:Representation',
-                            ns,
-                        )
-                        if a_rep is not None:
-                            available_options.append(
-                                {
-                                    "type": "DASH_AUDIO",
-                                    "label": "Àudio",
-                                    "tag": f"{Color.GREEN}[Descàrrega DASH]{Color.END}",
-                                    "url": mpd_url,
-                                    "a_rep": a_rep,
-                                    "ns": ns,
-                                }
-                            )
-
-                    elif s.get("label") != "DASH":
-                        q_label = get_quality_label(None, None, s.get("label"))
-                        tag_color = Color.GREEN if m_type == "audio" else Color.BLUE
-                        available_options.append(
-                            {
-                                "type": "DIRECT",
-                                "label": f"{'Àudio' if m_type == 'audio' else 'Vídeo'} - {q_label}",
-                                "tag": f"{tag_color}[Descàrrega directa]{Color.END}",
-                                "url": s.get("file"),
-                            }
-                        )
 
-                for v in variants:
-                    label = v.get("label", "Variant")
-                    v_type_name = v.get("nom", "Variant")
-                    v_sources = v.get("media", {}).get("url", [])
-                    for vs in v_sources:
-                        if vs.get("label") != "DASH":
-                            q_label = get_quality_label(None, None, vs.get("label"))
-                            available_options.append(
-                                {
-                                    "type": "DIRECT",
-                                    "label": f"{v_type_name} - {q_label}",
-                                    "tag": f"{Color.MAGENTA}[{label}]{Color.END}",
-                                    "url": vs.get("file"),
-                                    "suffix": f" ({v_type_name})",
-                                }
-                            )
-
-                for sub in subtitols:
-                    available_options.append(
-                        {
-                            "type": "SUB",
-                            "label": f"{sub.get('text')}",
-                            "tag": f"{Color.BOLD}[Subtítols]{Color.END}",
-                            "url": sub.get("url"),
-                            "lang": sub.get("iso", "ca"),
-                        }
-                    )
+class ProgressTask:
+    def __init__(self, tracker, label, total, done=0):
+        self.tracker = tracker
+        self.label = label
+        self.total = total
+        self.done = done
+        self.bytes = done
+        self.sample = (time.monotonic(), done, done)
+        self.speed = 0.0
+        self.rate = 0.0
 
-                print(
-                    f"\n   {Color.BOLD}Seleccioneu una opció de descàrrega:{Color.END}\n"
-                )
-                for i, opt in enumerate(available_options, start=1):
-                    print(f"    {i:2}. {opt['tag']} {opt['label']}")
+    def update(self, done, nbytes=None):
+        self.done = done
+        self.bytes = done if nbytes is None else nbytes
 
-                new_search_idx = len(available_options) + 1
-                exit_idx = len(available_options) + 2
-                print(f"    {new_search_idx:2}. {Color.YELLOW}[Nova cerca]{Color.END}")
-                print(f"    {exit_idx:2}. {Color.RED}[Sortir del programa]{Color.END}")
+    def close(self):
+        self.tracker.remove(self)
 
-                try:
-                    choice_str = input(
-                        f"\n   {Color.GREEN}Opció (1-{exit_idx}) > {Color.END}"
-                    )
-                    if not choice_str:
-                        continue
-                    choice = int(choice_str)
-                except ValueError:
-                    continue
+    def __enter__(self):
+        return self
 
-                if choice == exit_idx:
-                    print_exit_message()
-                    return
+    def __exit__(self, *exc):
+        self.close()
 
-                if choice == new_search_idx:
-                    break
 
-                selected = available_options[choice - 1]
+class ProgressStream:
+    def __init__(self, tracker, stream):
+        self.tracker = tracker
+        self.stream = stream
 
-                if selected["type"] == "SUB":
-                    output = f"{titol}.{selected['lang']}.vtt"
-                    download_file(selected["url"], output)
-                    vtt_to_srt(output)
-
-                elif selected["type"] == "DIRECT":
-                    ext = ".mp3" if m_type == "audio" else ".mp4"
-                    output = f"{titol}{selected.get('suffix', '')}{ext}"
-                    download_file(selected["url"], output)
-
-                elif selected["type"] == "DASH_AUDIO":
-                    output = f"{titol}.m4a"
-                    base_url = selected["url"].rsplit("/", 1)[0] + "/"
-                    download_segments(
-                        base_url,
-                        selected["a_rep"].find("dash:SegmentTemplate", selected["ns"]),
-                        total_sec,
-                        output,
-                    )
+    def write(self, data):
+        with self.tracker.lock:
+            self.tracker.clear()
+            if data:
+                self.tracker.line_start = data.endswith("\n")
+            return self.stream.write(data)
 
-                elif selected["type"] == "DASH_VIDEO":
-                    output = f"{titol}.mp4"
-                    base_url = selected["url"].rsplit("/", 1)[0] + "/"
-                    v_temp, a_temp = f"v_{media_id}.tmp", f"a_{media_id}.tmp"
-                    a_rep = selected["root"].find(
-                        './/dash:AdaptationSet[@mimeType="audio/mp4"]/dash:Representation',
-                        selected["ns"],
-                    )
-                    download_segments(
-                        base_url,
-                        selected["v_rep"].find("dash:SegmentTemplate", selected["ns"]),
-                        total_sec,
-                        v_temp,
-                    )
-                    download_segments(
-                        base_url,
-                        a_rep.find("dash:SegmentTemplate", selected["ns"]),
-                        total_sec,
-                        a_temp,
-                    )
-                    print(
-                        f"\n   {Color.YELLOW}[*] Combinant pistes amb FFmpeg...{Color.END}"
-                    )
-                    subprocess.run(
-                        [
-                            "ffmpeg",
-                            "-y",
-                            "-i",
-                            v_temp,
-                            "-i",
-                            a_temp,
-                            "-c",
-                            "copy",
-                            output,
-                        ],
-                        check=True,
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.STDOUT,
-                    )
-                    os.remove(v_temp)
-                    os.remove(a_temp)
-                    print(f"   {Color.GREEN}✔ Vídeo finalitzat amb èxit.{Color.END}")
+    def flush(self):
+        self.stream.flush()
 
-                input(f"\n   {Color.BOLD}Premeu INTRO per tornar al menú...{Color.END}")
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class ProgressTracker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tasks = []
+        self.stream = None
+        self.tty = False
+        self.drawn = 0
+        self.line_start = True
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def task(self, label, total, done=0):
+        task = ProgressTask(self, label, total, done)
+        with self.lock:
+            self.tasks.append(task)
+        return task
+
+    def remove(self, task):
+        with self.lock:
+            if task in self.tasks:
+                self.tasks.remove(task)
+
+    @contextlib.contextmanager
+    def session(self):
+        if not Config.SHOW_PROGRESS or self.thread is not None:
+            yield
+            return
+
+        self.stream = sys.stdout
+        self.tty = self.stream.isatty()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        try:
+            with contextlib.redirect_stdout(ProgressStream(self, self.stream)):
+                yield
+        finally:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+            with self.lock:
+                self.clear()
+            self.stream = None
+
+    def run(self):
+        interval = (
+            Config.PROGRESS_INTERVAL if self.tty else Config.PROGRESS_LOG_INTERVAL
+        )
+        while not self.stopped.wait(interval):
+            self.render()
+
+    def measure(self, task, now):
+        started, done, nbytes = task.sample
+        elapsed = now - started
+        if elapsed <= 0:
+            return
+        weight = 0.3 if task.speed else 1.0
+        task.speed += weight * ((task.bytes - nbytes) / elapsed - task.speed)
+        task.rate += weight * ((task.done - done) / elapsed - task.rate)
+        task.sample = (now, task.done, task.bytes)
+
+    def describe(self, task):
+        eta = None
+        if task.total and task.rate > 0:
+            eta = max(0, task.total - task.done) / task.rate
+        return (
+            f"{task.bytes / 1048576:.1f} MB, {task.speed / 1048576:.1f} MB/s, "
+            f"ETA {format_eta(eta)}"
+        )
+
+    def clear(self):
+        if self.drawn:
+            self.stream.write(f"\033[{self.drawn}F\033[J")
+            self.drawn = 0
+
+    def render(self):
+        now = time.monotonic()
+        with self.lock:
+            tasks = self.tasks[-Config.PROGRESS_BARS :]
+            for task in tasks:
+                self.measure(task, now)
+
+            if not self.tty:
+                for task in tasks:
+                    percent = (
+                        f"{task.done / task.total * 100:.1f}%" if task.total else "?"
+                    )
+                    self.stream.write(
+                        f"       {task.label}: {percent} ({self.describe(task)})\n"
+                    )
+                self.stream.flush()
+                return
+
+            cols = get_terminal_width() - 1
+            suffixes = []
+            for task in tasks:
+                fraction = min(1.0, task.done / task.total) if task.total else 0.0
+                filled = int(fraction * 20)
+                bar = "█" * filled + "░" * (20 - filled)
+                suffixes.append(
+                    f" |{bar}| {fraction * 100:5.1f}% {self.describe(task)}"
+                )
+            width = min(
+                max((len(task.label) for task in tasks), default=0),
+                cols - 7 - max(map(len, suffixes), default=0),
+            )
+            width = max(8, width)
+            lines = []
+            for task, suffix in zip(tasks, suffixes):
+                label = task.label
+                if len(label) > width:
+                    label = "…" + label[1 - width :]
+                line = f"       {label:<{width}}{suffix}"
+                lines.append(f"{line[:cols]}\033[K\n")
+            self.clear()
+            if lines and not self.line_start:
+                self.stream.write("\n")
+                self.line_start = True
+            self.stream.write("".join(lines))
+            self.stream.flush()
+            self.drawn = len(lines)
+
+
+PROGRESS = ProgressTracker()
+
+
+BUFFERS = threading.local()
+
+
+def get_buffer():
+    buffer = getattr(BUFFERS, "buffer", None)
+    if buffer is None or len(buffer) != Config.BLOCK_SIZE:
+        buffer = BUFFERS.buffer = memoryview(bytearray(Config.BLOCK_SIZE))
+    return buffer
+
+
+class TokenBucket:
+    def __init__(self, rate):
+        self.lock = threading.Lock()
+        self.configure(rate)
+
+    def configure(self, rate):
+        with self.lock:
+            self.rate = rate
+            self.capacity = max(rate / 4, 64 * 1024)
+            self.tokens = self.capacity
+            self.updated = time.monotonic()
+
+    def chunk(self, size):
+        return min(size, int(self.capacity)) if self.rate else size
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+BANDWIDTH = TokenBucket(Config.MAX_BANDWIDTH)
+
+
+class StreamHasher:
+    def __init__(self, out_file=None):
+        self.out_file = out_file
+        self.reset()
+
+    def reset(self):
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def update(self, data):
+        self.digest.update(data)
+        self.size += len(data)
+
+    def update_from(self, path, start, end):
+        with open(path, "rb") as f:
+            f.seek(start)
+            while start < end:
+                chunk = f.read(min(Config.BLOCK_SIZE, end - start))
+                if not chunk:
+                    raise Exception("El fitxer parcial és més curt del previst.")
+                self.update(chunk)
+                start += len(chunk)
+
+    def write(self, data):
+        written = self.out_file.write(data)
+        self.update(data)
+        return written
+
+    def result(self, **fields):
+        return dict(size=self.size, sha256=self.digest.hexdigest(), **fields)
+
+
+def copy_stream(response, out_file, on_bytes=None, limit=None):
+    buffer = get_buffer()
+    buffer = buffer[: BANDWIDTH.chunk(len(buffer))]
+    copied = 0
+    while limit is None or copied < limit:
+        if limit is not None and limit - copied < len(buffer):
+            buffer = buffer[: limit - copied]
+        count = response.readinto(buffer)
+        if not count:
+            break
+        BANDWIDTH.consume(count)
+        out_file.write(buffer[:count])
+        copied += count
+        if on_bytes:
+            on_bytes(count)
+    return copied
+
+
+def preallocate(out_file, size):
+    out_file.flush()
+    current = os.fstat(out_file.fileno()).st_size
+    if size <= current:
+        return
+    try:
+        os.posix_fallocate(out_file.fileno(), current, size - current)
+    except (AttributeError, OSError):
+        out_file.truncate(size)
+
+
+def fetch_once(url, timeout, headers=None, stop=None):
+    with http_open(url, headers, timeout=timeout) as resp:
+        expected = resp.headers.get("Content-Length")
+        if not BANDWIDTH.rate and stop is None:
+            data = resp.read()
+        else:
+            size = Config.BLOCK_SIZE if stop is None else Config.HEDGE_CHUNK_SIZE
+            chunks = []
+            while True:
+                if stop is not None and stop():
+                    raise JobCancelled("Petició descartada.")
+                chunk = resp.read(BANDWIDTH.chunk(size))
+                if not chunk:
+                    break
+                BANDWIDTH.consume(len(chunk))
+                chunks.append(chunk)
+            data = b"".join(chunks)
+
+    if expected is not None and len(data) != int(expected):
+        raise Exception(f"Resposta incompleta ({len(data)} de {expected} bytes).")
+    return data
+
+
+def fetch_hedged(url, timeout, hedge_after, track=None, index=None, policy=None):
+    import queue
+
+    policy = policy or RetryPolicy()
+    results = queue.Queue()
+    finished = threading.Event()
+
+    def stop():
+        return finished.is_set() or policy.cancelled.is_set()
+
+    def run():
+        try:
+            results.put((True, fetch_once(url, timeout, stop=stop)))
+        except Exception as e:
+            results.put((False, e))
+
+    threading.Thread(target=run, daemon=True).start()
+    in_flight = 0
+    try:
+        try:
+            ok, value = results.get(timeout=hedge_after)
+        except queue.Empty:
+            if policy.spend():
+                EVENTS.emit("hedge", track=track, index=index, url=url)
+                threading.Thread(target=run, daemon=True).start()
+                in_flight = 1
+            ok, value = results.get()
+
+        if not ok and in_flight:
+            ok, value = results.get()
+    finally:
+        finished.set()
+    if not ok:
+        raise value
+    return value
+
+
+def fetch_cached(url, track, index):
+    data = SEGMENT_CACHE.get(url)
+    if data is not None:
+        EVENTS.emit("cache", track=track, index=index, url=url, bytes=len(data))
+    return data
+
+
+def fetch_init(url, track=None, policy=None):
+    policy = policy or RetryPolicy()
+    data = fetch_cached(url, track, "init")
+    if data is not None:
+        return data
+
+    for attempt in range(Config.MAX_RETRIES):
+        policy.check()
+        started = time.time()
+        try:
+            data = fetch_once(url, Config.TIMEOUT)
+            check_fmp4(data, init=True)
+            EVENTS.emit(
+                "segment",
+                track=track,
+                index="init",
+                url=url,
+                bytes=len(data),
+                latency=round(time.time() - started, 4),
+                retries=attempt,
+            )
+            SEGMENT_CACHE.put(url, data)
+            return data
+        except Exception as e:
+            EVENTS.emit(
+                "retry",
+                track=track,
+                index="init",
+                url=url,
+                attempt=attempt + 1,
+                error=str(e),
+            )
+            if not policy.retry(attempt, e):
+                break
+
+    raise Exception("No s'ha pogut descarregar la capçalera.")
+
+
+def fetch_segment(url, index, track=None, policy=None, stopped=None):
+    policy = policy or RetryPolicy()
+    stopped = stopped or threading.Event()
+    data = fetch_cached(url, track, index)
+    if data is not None:
+        return data
+
+    for attempt in range(Config.MAX_RETRIES):
+        policy.check()
+        if stopped.is_set():
+            raise JobCancelled("Pista aturada.")
+        started = time.time()
+        try:
+            timeout = policy.timeout(track)
+            hedge_after = policy.hedge_after(track)
+            if hedge_after is None:
+                data = fetch_once(url, timeout)
+            else:
+                data = fetch_hedged(url, timeout, hedge_after, track, index, policy)
+            check_fmp4(data)
+            latency = time.time() - started
+            policy.record(track, latency)
+            EVENTS.emit(
+                "segment",
+                track=track,
+                index=index,
+                url=url,
+                bytes=len(data),
+                latency=round(latency, 4),
+                retries=attempt,
+            )
+            SEGMENT_CACHE.put(url, data)
+            return data
+        except Exception as e:
+            if stopped.is_set():
+                raise
+            EVENTS.emit(
+                "retry",
+                track=track,
+                index=index,
+                url=url,
+                attempt=attempt + 1,
+                error=str(e),
+            )
+            current_attempt = attempt + 1
+            print(
+                f"\r\033[K{Color.RED}       [!] Tall detectat al segment {index}. Intent {current_attempt}/{Config.MAX_RETRIES}...{Color.END}",
+                end="",
+            )
+            sys.stdout.flush()
+
+            if not policy.retry(attempt, e):
+                print()
+                raise Exception(
+                    f"Connexió perduda descarregant el segment {index}: {e}\n"
+                )
+
+
+def stream_segments(
+    init_url,
+    urls,
+    write,
+    workers=None,
+    on_segment=None,
+    start=0,
+    track=None,
+    policy=None,
+):
+    policy = policy or RetryPolicy()
+    total_segments = len(urls)
+    workers = max(1, workers or Config.SEGMENT_WORKERS)
+    window = max(workers, Config.BUFFERED_SEGMENTS)
+
+    started = time.time()
+    written = 0
+    if start == 0 and init_url:
+        data = fetch_init(init_url, track, policy)
+        write(data)
+        written += len(data)
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = {}
+    stopped = threading.Event()
+    try:
+        next_submit = start
+        for i in range(start, total_segments):
+            while next_submit < total_segments and next_submit - i < window:
+                pending[next_submit] = pool.submit(
+                    fetch_segment,
+                    urls[next_submit],
+                    next_submit,
+                    track,
+                    policy,
+                    stopped,
+                )
+                next_submit += 1
+
+            data = pending.pop(i).result()
+            write(data)
+            written += len(data)
+
+            if on_segment:
+                on_segment(i + 1, total_segments, written)
+    finally:
+        stopped.set()
+        pool.shutdown(wait=not pending, cancel_futures=True)
+
+    EVENTS.emit(
+        "track",
+        name=track,
+        segments=total_segments - start,
+        bytes=written,
+        seconds=round(time.time() - started, 3),
+    )
+
+
+def new_segment_state(init_url, urls):
+    return {
+        "init": init_url,
+        "media": urls[:1],
+        "total": len(urls),
+        "segments": 0,
+        "offset": 0,
+    }
+
+
+@profiled("download")
+def download_segments(init_url, urls, temp_filename, workers=None, policy=None):
+    print(f"\n{Color.YELLOW}   [*] Descarregant segments: {temp_filename}{Color.END}")
+
+    part_path = temp_filename + ".part"
+    state = load_checkpoint(part_path)
+    if (
+        state
+        and state.get("init") == init_url
+        and state.get("media") == urls[:1]
+        and state.get("total") == len(urls)
+        and os.path.exists(temp_filename)
+        and os.path.getsize(temp_filename) >= state.get("offset", 0)
+    ):
+        start = state["segments"]
+        print(f"       {Color.GRAY}Es reprèn a partir del segment {start}.{Color.END}")
+    else:
+        state = new_segment_state(init_url, urls)
+        start = 0
+
+    try:
+        with open(temp_filename, "r+b" if start else "wb") as out_file:
+            out_file.truncate(state["offset"])
+            out_file.seek(state["offset"])
+            hasher = StreamHasher(out_file)
+            hasher.update_from(temp_filename, 0, state["offset"])
+
+            def on_segment(done, total, written):
+                out_file.flush()
+                state["segments"] = done
+                state["offset"] = out_file.tell()
+                save_checkpoint(part_path, state)
+                task.update(done, state["offset"])
+
+            with PROGRESS.task(
+                os.path.basename(temp_filename), len(urls), start
+            ) as task:
+                stream_segments(
+                    init_url,
+                    urls,
+                    hasher.write,
+                    workers,
+                    on_segment,
+                    start,
+                    os.path.basename(temp_filename),
+                    policy,
+                )
+
+        remove_checkpoint(part_path)
+        print(f"\n       {Color.GREEN}✔ Segments completats.{Color.END}")
+        return hasher.result(segments=len(urls) + 1)
+
+    except Exception as e:
+        print(f"\n{Color.RED}   [!] Error: {e}{Color.END}")
+        if state["segments"]:
+            print(
+                f"   {Color.GRAY}Torneu a executar la mateixa descàrrega per reprendre-la.{Color.END}"
+            )
+        else:
+            remove_checkpoint(part_path)
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+        raise DownloadError(str(e))
+
+
+def use_builtin_muxer():
+    return Config.MUXER == "builtin" or (Config.MUXER == "auto" and not check_ffmpeg())
+
+
+def can_stream_mux():
+    return Config.STREAM_MUX and os.name != "nt"
+
+
+@profiled("mux")
+def mux_streaming(video, audio, output, workers=None, policy=None):
+    import subprocess
+
+    policy = policy or RetryPolicy()
+    print(
+        f"\n{Color.YELLOW}   [*] Descarregant i combinant pistes amb FFmpeg: {output}{Color.END}"
+    )
+
+    v_read, v_write = os.pipe()
+    a_read, a_write = os.pipe()
+    mux_started = time.time()
+    try:
+        proc = subprocess.Popen(
+            [
+                "ffmpeg",
+                "-y",
+                "-i",
+                f"pipe:{v_read}",
+                "-i",
+                f"pipe:{a_read}",
+                "-c",
+                "copy",
+                output,
+            ],
+            pass_fds=(v_read, a_read),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.STDOUT,
+        )
+    except Exception:
+        os.close(v_write)
+        os.close(a_write)
+        raise
+    finally:
+        os.close(v_read)
+        os.close(a_read)
+
+    errors = []
+    tasks = {
+        track: PROGRESS.task(f"{os.path.basename(output)} ({track})", len(urls[1]))
+        for track, urls in (("video", video), ("audio", audio))
+    }
+
+    hashers = {}
+
+    def feed(track, urls, fd):
+        try:
+            with os.fdopen(fd, "wb") as pipe:
+                hashers[track] = StreamHasher(pipe)
+                stream_segments(
+                    urls[0],
+                    urls[1],
+                    hashers[track].write,
+                    workers,
+                    lambda done, total, written: tasks[track].update(done, written),
+                    track=f"{os.path.basename(output)}:{track}",
+                    policy=policy,
+                )
+        except Exception as e:
+            errors.append(e)
+            proc.kill()
+
+    feeders = [
+        threading.Thread(target=feed, args=("video", video, v_write)),
+        threading.Thread(target=feed, args=("audio", audio, a_write)),
+    ]
+    try:
+        for t in feeders:
+            t.start()
+        for t in feeders:
+            t.join()
+    finally:
+        for task in tasks.values():
+            task.close()
+    returncode = proc.wait()
+    EVENTS.emit(
+        "mux",
+        output=output,
+        mode="ffmpeg-stream",
+        seconds=round(time.time() - mux_started, 3),
+        returncode=returncode,
+    )
+
+    if errors or returncode != 0:
+        error = next(
+            (e for e in errors if not isinstance(e, BrokenPipeError)),
+            f"FFmpeg ha acabat amb el codi {returncode}.",
+        )
+        print(f"\n{Color.RED}   [!] Error: {error}{Color.END}")
+        if os.path.exists(output):
+            os.remove(output)
+        raise DownloadError(str(error))
+
+    print(f"\n       {Color.GREEN}✔ Segments completats.{Color.END}")
+    return {
+        "size": os.path.getsize(output),
+        "tracks": {
+            track: hashers[track].result(segments=len(urls[1]) + 1)
+            for track, urls in (("video", video), ("audio", audio))
+        },
+    }
+
+
+MP4_CONTAINERS = (
+    b"moov",
+    b"trak",
+    b"mdia",
+    b"minf",
+    b"stbl",
+    b"mvex",
+    b"moof",
+    b"traf",
+)
+
+
+def mp4_box(kind, body):
+    return struct.pack(">I", 8 + len(body)) + kind + body
+
+
+DEFAULT_FTYP = mp4_box(b"ftyp", b"iso6" + struct.pack(">I", 0) + b"iso6isomdash")
+
+
+def iter_boxes(data, start=0, end=None):
+    end = len(data) if end is None else end
+    while start + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, start)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, start + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header or start + size > end:
+            raise Exception("Segment MP4 malmès.")
+        yield kind, start, start + header, start + size
+        start += size
+
+
+def find_box(data, path, start=0, end=None):
+    for kind, box_start, body, box_end in iter_boxes(data, start, end):
+        if kind == path[0]:
+            if len(path) == 1:
+                return box_start, body, box_end
+            return find_box(data, path[1:], body, box_end)
+    return None
+
+
+def check_fmp4(data, init=False):
+    kinds = set()
+    end = 0
+    for kind, _, _, end in iter_boxes(data):
+        kinds.add(kind)
+    if end != len(data):
+        raise Exception("Segment MP4 truncat.")
+    missing = [
+        k.decode()
+        for k in ((b"moov",) if init else (b"moof", b"mdat"))
+        if k not in kinds
+    ]
+    if missing:
+        raise Exception(f"Segment MP4 sense caixa {', '.join(missing)}.")
+
+
+def set_track_id(data, path, track_id, offsets):
+    found = find_box(data, path)
+    if found is None:
+        return
+    version = data[found[1]]
+    struct.pack_into(">I", data, found[1] + offsets[min(version, 1)], track_id)
+
+
+def movie_timescale(init):
+    mvhd = find_box(init, (b"moov", b"mvhd"))
+    if mvhd is None:
+        return None
+    offset = 20 if init[mvhd[1]] == 1 else 12
+    return struct.unpack_from(">I", init, mvhd[1] + offset)[0] or None
+
+
+def rescale_movie_durations(trak, source, target):
+    if not source or not target or source == target:
+        return
+
+    def rescale(offset, wide):
+        fmt = ">Q" if wide else ">I"
+        value = struct.unpack_from(fmt, trak, offset)[0]
+        if value != (0xFFFFFFFFFFFFFFFF if wide else 0xFFFFFFFF):
+            struct.pack_into(fmt, trak, offset, value * target // source)
+
+    tkhd = find_box(trak, (b"trak", b"tkhd"))
+    if tkhd is not None:
+        wide = trak[tkhd[1]] == 1
+        rescale(tkhd[1] + (28 if wide else 20), wide)
+
+    elst = find_box(trak, (b"trak", b"edts", b"elst"))
+    if elst is not None:
+        wide = trak[elst[1]] == 1
+        count = struct.unpack_from(">I", trak, elst[1] + 4)[0]
+        for i in range(count):
+            rescale(elst[1] + 8 + i * (20 if wide else 12), wide)
+
+
+def merge_init_segments(video_init, audio_init):
+    header = DEFAULT_FTYP
+    for init in (video_init, audio_init):
+        ftyp = find_box(init, (b"ftyp",))
+        if ftyp is not None:
+            header = bytes(init[ftyp[0] : ftyp[2]])
+            break
+
+    children = []
+    traks = []
+    extends = []
+    timescale = movie_timescale(video_init)
+    for track_id, init in ((1, video_init), (2, audio_init)):
+        moov = find_box(init, (b"moov",))
+        if moov is None:
+            raise Exception("La capçalera de la pista no conté cap 'moov'.")
+
+        trex = None
+        for kind, start, body, end in iter_boxes(init, moov[1], moov[2]):
+            if kind == b"trak":
+                trak = bytearray(init[start:end])
+                set_track_id(trak, (b"trak", b"tkhd"), track_id, (12, 20))
+                rescale_movie_durations(trak, movie_timescale(init), timescale)
+                traks.append(bytes(trak))
+            elif kind == b"mvex":
+                for sub_kind, sub_start, _, sub_end in iter_boxes(init, body, end):
+                    if sub_kind == b"trex":
+                        trex = bytearray(init[sub_start:sub_end])
+                        struct.pack_into(">I", trex, 12, track_id)
+                    elif track_id == 1:
+                        extends.append(init[sub_start:sub_end])
+            elif track_id == 1:
+                box = bytearray(init[start:end])
+                if kind == b"mvhd":
+                    struct.pack_into(">I", box, len(box) - 4, 3)
+                children.append(bytes(box))
+
+        if trex is None:
+            trex = mp4_box(b"trex", struct.pack(">IIIIII", 0, track_id, 1, 0, 0, 0))
+        extends.append(bytes(trex))
+
+    mvex = mp4_box(b"mvex", b"".join(extends))
+    return header + mp4_box(b"moov", b"".join(children + traks) + mvex)
+
+
+def track_timescale(init):
+    mdhd = find_box(init, (b"moov", b"trak", b"mdia", b"mdhd"))
+    if mdhd is None:
+        return 1
+    offset = 20 if init[mdhd[1]] == 1 else 12
+    return struct.unpack_from(">I", init, mdhd[1] + offset)[0] or 1
+
+
+class Fmp4Muxer:
+    def __init__(self, out_file, on_checkpoint=None):
+        self.out_file = out_file
+        self.on_checkpoint = on_checkpoint
+        self.cond = threading.Condition()
+        self.tracks = {}
+        for track_id, name in enumerate(("video", "audio"), start=1):
+            self.tracks[name] = {
+                "id": track_id,
+                "buffer": bytearray(),
+                "init": None,
+                "timescale": 1,
+                "moof": None,
+                "time": 0,
+                "queue": deque(),
+                "done": False,
+                "segment": 0,
+                "complete": 0,
+                "partial": False,
+            }
+        self.sequence = 0
+        self.offset = 0
+        self.started = False
+        self.failed = False
+
+    def resume(self, state):
+        for name, track in self.tracks.items():
+            track["init"] = b""
+            track["timescale"] = state["timescales"][name]
+            track["segment"] = track["complete"] = state["segments"][name]
+        self.sequence = state["sequence"]
+        self.offset = state["offset"]
+        self.started = True
+
+    def checkpoint(self):
+        return {
+            "offset": self.offset,
+            "sequence": self.sequence,
+            "segments": {name: t["complete"] for name, t in self.tracks.items()},
+            "timescales": {name: t["timescale"] for name, t in self.tracks.items()},
+        }
+
+    def split(self, track, data):
+        buffer = track["buffer"]
+        buffer += data
+        ready = []
+        position = 0
+        while len(buffer) - position >= 8:
+            size, kind = struct.unpack_from(">I4s", buffer, position)
+            header = 8
+            if size == 1:
+                if len(buffer) - position < 16:
+                    break
+                size = struct.unpack_from(">Q", buffer, position + 8)[0]
+                header = 16
+            if size < header:
+                raise Exception("Segment MP4 malmès.")
+            end = position + size
+            if end > len(buffer):
+                break
+
+            if track["init"] is None:
+                if kind == b"moov":
+                    track["init"] = bytes(buffer[:end])
+                    track["timescale"] = track_timescale(track["init"])
+            elif kind == b"moof":
+                track["moof"] = self.retrack(track, bytearray(buffer[position:end]))
+            elif kind == b"mdat" and track["moof"] is not None:
+                ready.append(
+                    (
+                        track["time"],
+                        track["moof"] + buffer[position:end],
+                        track["segment"],
+                    )
+                )
+                track["moof"] = None
+            position = end
+
+        del buffer[:position]
+        return ready
+
+    def retrack(self, track, moof):
+        traf = find_box(moof, (b"moof", b"traf"))
+        tfhd = find_box(moof, (b"moof", b"traf", b"tfhd"))
+        if traf is None or tfhd is None:
+            raise Exception("Fragment MP4 sense capçalera de pista.")
+        if struct.unpack_from(">I", moof, tfhd[1])[0] & 0x000001:
+            raise Exception("Els fragments amb base-data-offset no es poden combinar.")
+        struct.pack_into(">I", moof, tfhd[1] + 4, track["id"])
+
+        tfdt = find_box(moof, (b"tfdt",), traf[1], traf[2])
+        if tfdt is not None:
+            if moof[tfdt[1]] == 1:
+                decode_time = struct.unpack_from(">Q", moof, tfdt[1] + 4)[0]
+            else:
+                decode_time = struct.unpack_from(">I", moof, tfdt[1] + 4)[0]
+            track["time"] = decode_time / track["timescale"]
+        return moof
+
+    def write(self, name, data):
+        track = self.tracks[name]
+        had_init = track["init"] is not None
+        ready = self.split(track, data)
+        if had_init:
+            track["segment"] += 1
+
+        with self.cond:
+            if self.failed:
+                raise Exception("La fusió de pistes s'ha interromput.")
+            track["queue"].extend(ready)
+            if had_init != (track["init"] is not None):
+                self.cond.notify_all()
+            self.pump()
+            while len(track["queue"]) > Config.BUFFERED_SEGMENTS and not self.failed:
+                self.cond.wait()
+
+    def finish(self, name):
+        track = self.tracks[name]
+        if track["buffer"] or track["moof"] is not None or track["init"] is None:
+            self.abort()
+            raise Exception("La pista MP4 ha acabat a mitges.")
+        with self.cond:
+            track["done"] = True
+            self.pump()
+
+    def abort(self):
+        with self.cond:
+            self.failed = True
+            self.cond.notify_all()
+
+    def pump(self):
+        video, audio = self.tracks["video"], self.tracks["audio"]
+        if not self.started:
+            if video["init"] is None or audio["init"] is None:
+                return
+            init = merge_init_segments(video["init"], audio["init"])
+            self.out_file.write(init)
+            self.offset += len(init)
+            self.started = True
+
+        wrote = False
+        while True:
+            ready = [t for t in (video, audio) if t["queue"]]
+            blocked = [t for t in (video, audio) if not t["queue"] and not t["done"]]
+            if not ready or blocked:
+                break
+
+            track = min(ready, key=lambda t: t["queue"][0][0])
+            _, fragment, segment = track["queue"].popleft()
+            self.sequence += 1
+            mfhd = find_box(fragment, (b"moof", b"mfhd"))
+            if mfhd is not None:
+                struct.pack_into(">I", fragment, mfhd[1] + 4, self.sequence)
+            self.out_file.write(fragment)
+            self.offset += len(fragment)
+            track["partial"] = bool(track["queue"]) and track["queue"][0][2] == segment
+            track["complete"] = segment if track["partial"] else segment + 1
+            wrote = True
+
+        if wrote:
+            if self.on_checkpoint and not (video["partial"] or audio["partial"]):
+                self.on_checkpoint(self.checkpoint())
+            self.cond.notify_all()
+
+
+@profiled("mux")
+def mux_builtin(video, audio, output, workers=None, policy=None):
+    policy = policy or RetryPolicy()
+    print(
+        f"\n{Color.YELLOW}   [*] Descarregant i combinant pistes: {output}{Color.END}"
+    )
+
+    part_path = output + ".part"
+    tracks = {
+        "video": [video[0], video[1][:1], len(video[1])],
+        "audio": [audio[0], audio[1][:1], len(audio[1])],
+    }
+    state = load_checkpoint(part_path)
+    if (
+        state
+        and state.get("tracks") == tracks
+        and os.path.exists(output)
+        and os.path.getsize(output) >= state.get("offset", 0)
+    ):
+        starts = state["segments"]
+        print(
+            f"       {Color.GRAY}Es reprèn a partir dels segments {starts['video']} (vídeo) i {starts['audio']} (àudio).{Color.END}"
+        )
+    else:
+        state = None
+        starts = {"video": 0, "audio": 0}
+        remove_checkpoint(part_path)
+
+    mux_started = time.time()
+    errors = []
+    tasks = {
+        track: PROGRESS.task(
+            f"{os.path.basename(output)} ({track})", len(urls[1]), starts[track]
+        )
+        for track, urls in (("video", video), ("audio", audio))
+    }
+
+    try:
+        with open(output, "r+b" if state else "wb") as out_file:
+            offset = state["offset"] if state else 0
+            out_file.truncate(offset)
+            out_file.seek(offset)
+            hasher = StreamHasher(out_file)
+            hasher.update_from(output, 0, offset)
+
+            def on_checkpoint(muxer_state):
+                out_file.flush()
+                save_checkpoint(part_path, dict(muxer_state, tracks=tracks))
+
+            muxer = Fmp4Muxer(hasher, on_checkpoint)
+            if state:
+                muxer.resume(state)
+
+            def feed(track, urls):
+                try:
+                    stream_segments(
+                        urls[0],
+                        urls[1],
+                        lambda data: muxer.write(track, data),
+                        workers,
+                        lambda done, total, written: tasks[track].update(done, written),
+                        starts[track],
+                        f"{os.path.basename(output)}:{track}",
+                        policy,
+                    )
+                    muxer.finish(track)
+                except Exception as e:
+                    errors.append(e)
+                    muxer.abort()
+
+            feeders = [
+                threading.Thread(target=feed, args=("video", video)),
+                threading.Thread(target=feed, args=("audio", audio)),
+            ]
+            for t in feeders:
+                t.start()
+            for t in feeders:
+                t.join()
+    finally:
+        for task in tasks.values():
+            task.close()
+
+    EVENTS.emit(
+        "mux",
+        output=output,
+        mode="builtin-stream",
+        seconds=round(time.time() - mux_started, 3),
+    )
+
+    if errors:
+        print(f"\n{Color.RED}   [!] Error: {errors[0]}{Color.END}")
+        if os.path.exists(part_path):
+            print(
+                f"   {Color.GRAY}Torneu a executar la mateixa descàrrega per reprendre-la.{Color.END}"
+            )
+        elif os.path.exists(output):
+            os.remove(output)
+        raise DownloadError(str(errors[0]))
+
+    remove_checkpoint(part_path)
+    print(f"\n       {Color.GREEN}✔ Segments completats.{Color.END}")
+    return hasher.result(segments=len(video[1]) + len(audio[1]) + 2)
+
+
+@profiled("mux")
+def ffmpeg_merge(v_temp, a_temp, output):
+    import subprocess
+
+    subprocess.run(
+        ["ffmpeg", "-y", "-i", v_temp, "-i", a_temp, "-c", "copy", output],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.STDOUT,
+    )
+
+
+@profiled("mux")
+def merge_tracks(v_temp, a_temp, output):
+    errors = []
+    with open(output, "wb") as out_file:
+        hasher = StreamHasher(out_file)
+        muxer = Fmp4Muxer(hasher)
+
+        def feed(track, path):
+            try:
+                with open(path, "rb") as f:
+                    while True:
+                        chunk = f.read(Config.BLOCK_SIZE)
+                        if not chunk:
+                            break
+                        muxer.write(track, chunk)
+                muxer.finish(track)
+            except Exception as e:
+                errors.append(e)
+                muxer.abort()
+
+        feeders = [
+            threading.Thread(target=feed, args=("video", v_temp)),
+            threading.Thread(target=feed, args=("audio", a_temp)),
+        ]
+        for t in feeders:
+            t.start()
+        for t in feeders:
+            t.join()
+
+    if errors:
+        os.remove(output)
+        raise DownloadError(str(errors[0]))
+    return hasher.result()
+
+
+CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-\d+/(\d+|\*)")
+
+
+def parse_content_range(value):
+    match = CONTENT_RANGE.fullmatch((value or "").strip())
+    if not match:
+        return None, None
+    total = match.group(2)
+    return int(match.group(1)), None if total == "*" else int(total)
+
+
+def download_file_attempt(url, filename, state, part_path, policy, hasher, probe=None):
+    offset = state["offset"]
+    if probe is not None and offset:
+        probe.close()
+        probe = None
+    if state["size"] and offset >= state["size"]:
+        return
+
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        if state["etag"]:
+            headers["If-Range"] = state["etag"]
+
+    with probe or http_open(url, headers) as response:
+        if response.status == 206:
+            start, total_size = parse_content_range(
+                response.headers.get("Content-Range")
+            )
+            if start != offset or total_size is None:
+                state.update(offset=0, size=0, etag=None)
+                raise Exception("El servidor no indica la mida total del fitxer.")
+            if state["size"] and total_size != state["size"]:
+                state.update(offset=0, size=0, etag=None)
+                raise Exception("El fitxer del servidor ha canviat.")
+        else:
+            offset = 0
+            total_size = int(response.info().get("Content-Length", 0))
+
+        state.update(etag=response.headers.get("ETag"), size=total_size, offset=offset)
+        progress = {"downloaded": offset, "checkpointed": offset}
+        if hasher.size != offset:
+            hasher.reset()
+            hasher.update_from(filename, 0, offset)
+
+        with open(filename, "r+b" if offset else "wb") as out_file:
+            out_file.truncate(offset)
+            if total_size:
+                preallocate(out_file, total_size)
+            out_file.seek(offset)
+            hasher.out_file = out_file
+
+            def on_bytes(count):
+                policy.check()
+                progress["downloaded"] += count
+                state["offset"] = progress["downloaded"]
+
+                if (
+                    progress["downloaded"] - progress["checkpointed"]
+                    >= Config.CHECKPOINT_BYTES
+                ):
+                    out_file.flush()
+                    save_checkpoint(part_path, state)
+                    progress["checkpointed"] = progress["downloaded"]
+
+                task.update(progress["downloaded"])
+
+            with PROGRESS.task(os.path.basename(filename), total_size, offset) as task:
+                copy_stream(response, hasher, on_bytes)
+
+    downloaded = progress["downloaded"]
+    if total_size and downloaded != total_size:
+        raise Exception(f"Descàrrega incompleta ({downloaded} de {total_size} bytes).")
+
+
+def probe_ranges(url):
+    try:
+        with http_open(url, method="HEAD") as response:
+            response.read()
+            headers = response.headers
+    except Exception:
+        return None
+
+    size = int(headers.get("Content-Length") or 0)
+    if headers.get("Accept-Ranges", "").lower() != "bytes" or not size:
+        return None
+    return size, headers.get("ETag")
+
+
+def open_range_probe(url, filename, policy):
+    for attempt in range(Config.MAX_RETRIES):
+        policy.check()
+        try:
+            return http_open(url, {"Range": "bytes=0-"})
+        except Exception as e:
+            EVENTS.emit(
+                "retry",
+                name=os.path.basename(filename),
+                url=url,
+                attempt=attempt + 1,
+                error=str(e),
+            )
+            if not policy.retry(attempt, e):
+                print(
+                    f"\r\033[K       {Color.GRAY}No s'ha pogut comprovar si el servidor accepta rangs ({e}); es continua amb una sola connexió.{Color.END}"
+                )
+                return None
+
+
+class BlockWriter:
+    def __init__(self, out_file, block):
+        self.out_file = out_file
+        self.block = block
+
+    def write(self, data):
+        self.block += data
+        return self.out_file.write(data)
+
+
+def fetch_range(url, filename, start, end, etag, on_bytes, probe=None, block=None):
+    headers = {"Range": f"bytes={start}-{end}"}
+    if etag:
+        headers["If-Range"] = etag
+
+    written = 0
+    try:
+        with probe or http_open(url, headers) as response:
+            if response.status != 206:
+                raise RangesUnsupported()
+            with open(filename, "r+b") as out_file:
+                out_file.seek(start)
+
+                def on_chunk(count):
+                    nonlocal written
+                    written += count
+                    on_bytes(count)
+
+                if block is not None:
+                    out_file = BlockWriter(out_file, block)
+                copy_stream(response, out_file, on_chunk, end - start + 1)
+    except Exception:
+        on_bytes(-written)
+        raise
+
+    if written != end - start + 1:
+        on_bytes(-written)
+        raise Exception(f"Rang incomplet ({written} de {end - start + 1} bytes).")
+
+
+def download_file_ranged(url, filename, size, etag, part_path, policy, probe=None):
+    chunks = [
+        (start, min(start + Config.RANGE_CHUNK, size) - 1)
+        for start in range(0, size, Config.RANGE_CHUNK)
+    ]
+
+    state = load_checkpoint(part_path)
+    if (
+        state
+        and state.get("url") == url
+        and state.get("size") == size
+        and state.get("etag") == etag
+        and os.path.exists(filename)
+    ):
+        offset = min(state.get("offset", 0), os.path.getsize(filename))
+        done = set(state.get("done", []))
+        done.update(i for i, (_, end) in enumerate(chunks) if end < offset)
+    else:
+        done = set()
+        with open(filename, "wb") as out_file:
+            preallocate(out_file, size)
+
+    state = {"url": url, "etag": etag, "size": size, "offset": 0, "done": sorted(done)}
+    probes = {}
+    if probe is not None:
+        if 0 in done:
+            probe.close()
+        else:
+            probes[0] = probe
+    hasher = StreamHasher()
+    hash_lock = threading.Lock()
+    blocks = {}
+    lock = threading.Lock()
+    progress = {
+        "downloaded": sum(e - s + 1 for i, (s, e) in enumerate(chunks) if i in done),
+        "buffered": 0,
+    }
+
+    if done:
+        print(
+            f"       {Color.GRAY}Es reprèn a partir de {progress['downloaded'] / 1048576:.1f} MB.{Color.END}"
+        )
+    print(
+        f"       {Color.GRAY}Descàrrega en {Config.RANGE_CONNECTIONS} connexions.{Color.END}"
+    )
+
+    def on_bytes(count):
+        if count > 0:
+            policy.check()
+        with lock:
+            progress["downloaded"] += count
+            task.update(progress["downloaded"])
+
+    def reserve(length):
+        with lock:
+            if progress["buffered"] + length > Config.HASH_BUFFER:
+                return None
+            progress["buffered"] += length
+        return bytearray()
+
+    def release(length):
+        with lock:
+            progress["buffered"] -= length
+
+    def commit(index, block):
+        with lock:
+            done.add(index)
+            if block is not None:
+                blocks[index] = block
+            offset = 0
+            for i, (_, end) in enumerate(chunks):
+                if i not in done:
+                    break
+                offset = end + 1
+            state.update(offset=offset, done=sorted(done))
+            save_checkpoint(part_path, state)
+
+        with hash_lock:
+            while hasher.size < offset:
+                next_index = hasher.size // Config.RANGE_CHUNK
+                start, end = chunks[next_index]
+                with lock:
+                    block = blocks.pop(next_index, None)
+                if block is None:
+                    hasher.update_from(filename, start, end + 1)
+                else:
+                    hasher.update(block)
+                    release(len(block))
+
+    def fetch(index):
+        start, end = chunks[index]
+        for attempt in range(Config.MAX_RETRIES):
+            started = time.time()
+            block = reserve(end - start + 1)
+            try:
+                fetch_range(
+                    url,
+                    filename,
+                    start,
+                    end,
+                    etag,
+                    on_bytes,
+                    probes.pop(index, None),
+                    block,
+                )
+                EVENTS.emit(
+                    "range",
+                    name=os.path.basename(filename),
+                    index=index,
+                    url=url,
+                    bytes=end - start + 1,
+                    latency=round(time.time() - started, 4),
+                    retries=attempt,
+                )
+            except Exception as e:
+                if block is not None:
+                    release(end - start + 1)
+                if isinstance(e, RangesUnsupported):
+                    raise
+                EVENTS.emit(
+                    "retry",
+                    name=os.path.basename(filename),
+                    index=index,
+                    url=url,
+                    attempt=attempt + 1,
+                    error=str(e),
+                )
+                current_attempt = attempt + 1
+                print(
+                    f"\r\033[K{Color.RED}       [!] Tall detectat al bloc {index}. Intent {current_attempt}/{Config.MAX_RETRIES}...{Color.END}",
+                    end="",
+                )
+                sys.stdout.flush()
+
+                if not policy.retry(attempt, e):
+                    raise Exception(f"Connexió perduda ({e})")
+            else:
+                commit(index, block)
+                return
+
+    task = PROGRESS.task(os.path.basename(filename), size, progress["downloaded"])
+    pool = ThreadPoolExecutor(max_workers=Config.RANGE_CONNECTIONS)
+    try:
+        futures = [pool.submit(fetch, i) for i in range(len(chunks)) if i not in done]
+        for future in futures:
+            future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        for probe in probes.values():
+            probe.close()
+        task.close()
+
+    if hasher.size < size:
+        hasher.update_from(filename, hasher.size, size)
+    return hasher.result()
+
+
+@profiled("download")
+def download_file(url, filename, policy=None):
+    policy = policy or RetryPolicy()
+    print(f"\n{Color.YELLOW}   [*] Descarregant fitxer: {filename}{Color.END}")
+
+    part_path = filename + ".part"
+    started = time.time()
+
+    state = load_checkpoint(part_path) or {}
+    resuming = state.get("url") == url and "done" not in state and state.get("offset")
+    probe = None
+    if Config.RANGE_CONNECTIONS > 1 and not resuming:
+        probe = open_range_probe(url, filename, policy)
+        start, size = None, None
+        if probe is not None and probe.status == 206:
+            start, size = parse_content_range(probe.headers.get("Content-Range"))
+        if start == 0 and size and size > Config.RANGE_CHUNK:
+            ranged_probe, probe = probe, None
+            try:
+                integrity = download_file_ranged(
+                    url,
+                    filename,
+                    size,
+                    ranged_probe.headers.get("ETag"),
+                    part_path,
+                    policy,
+                    ranged_probe,
+                )
+                remove_checkpoint(part_path)
+                EVENTS.emit(
+                    "file",
+                    name=os.path.basename(filename),
+                    mode="ranged",
+                    bytes=size,
+                    seconds=round(time.time() - started, 3),
+                )
+                print(f"\n       {Color.GREEN}✔ Descàrrega completada.{Color.END}")
+                return integrity
+            except RangesUnsupported:
+                print(
+                    f"\r\033[K       {Color.GRAY}El servidor no accepta rangs; es continua amb una sola connexió.{Color.END}"
+                )
+            except Exception as e:
+                print(f"\n\n{Color.RED}   [!] Error: {e}.{Color.END}\n")
+                print(
+                    f"   {Color.GRAY}Torneu a executar la mateixa descàrrega per reprendre-la.{Color.END}\n"
+                )
+                raise DownloadError(str(e))
+
+    state = load_checkpoint(part_path)
+    if state and state.get("url") == url and os.path.exists(filename):
+        state["offset"] = min(state.get("offset", 0), os.path.getsize(filename))
+        state.pop("done", None)
+    else:
+        state = {"url": url, "etag": None, "size": 0, "offset": 0}
+
+    if state["offset"]:
+        print(
+            f"       {Color.GRAY}Es reprèn a partir de {state['offset'] / 1048576:.1f} MB.{Color.END}"
+        )
+
+    hasher = StreamHasher()
+    for attempt in range(Config.MAX_RETRIES):
+        attempt_started = time.time()
+        resumed_from = state["offset"]
+        attempt_probe, probe = probe, None
+        try:
+            download_file_attempt(
+                url, filename, state, part_path, policy, hasher, attempt_probe
+            )
+            remove_checkpoint(part_path)
+            EVENTS.emit(
+                "stream",
+                name=os.path.basename(filename),
+                url=url,
+                bytes=state["offset"] - resumed_from,
+                latency=round(time.time() - attempt_started, 4),
+                retries=attempt,
+            )
+            EVENTS.emit(
+                "file",
+                name=os.path.basename(filename),
+                mode="single",
+                bytes=state["offset"],
+                seconds=round(time.time() - started, 3),
+            )
+            print(f"\n       {Color.GREEN}✔ Descàrrega completada.{Color.END}")
+            return hasher.result()
+
+        except Exception as e:
+            EVENTS.emit(
+                "retry",
+                name=os.path.basename(filename),
+                url=url,
+                attempt=attempt + 1,
+                error=str(e),
+            )
+            current_attempt = attempt + 1
+            print(
+                f"\r\033[K{Color.RED}       [!] Tall detectat. Intent {current_attempt}/{Config.MAX_RETRIES}...{Color.END}",
+                end="",
+            )
+            sys.stdout.flush()
+
+            if not policy.retry(attempt, e):
+                print(
+                    f"\n\n{Color.RED}   [!] Error: Connexió perduda ({e}).{Color.END}\n"
+                )
+                if state["offset"] and (state["etag"] or state["size"]):
+                    save_checkpoint(part_path, state)
+                    print(
+                        f"   {Color.GRAY}Torneu a executar la mateixa descàrrega per reprendre-la.{Color.END}\n"
+                    )
+                else:
+                    remove_checkpoint(part_path)
+                    if os.path.exists(filename):
+                        os.remove(filename)
+                raise DownloadError(str(e))
+
+
+VTT_TIMESTAMP = re.compile(r"(\d{0,2}:?\d{2}:\d{2}[\.,]\d{3})")
+VTT_TAG = re.compile(r"<[^>]+>")
+
+
+def srt_timestamp(value):
+    value = value.replace(".", ",")
+    return f"00:{value}" if value.count(":") == 1 else value
+
+
+def iter_srt_cues(lines):
+    counter = 1
+    timing = None
+    text_lines = []
+
+    for line in itertools.chain(lines, [""]):
+        line = line.strip().lstrip("\ufeff")
+        is_timing = " --> " in line
+        if timing and (is_timing or not line or line.startswith("Region:")):
+            if is_timing and text_lines and text_lines[-1].isdigit():
+                text_lines.pop()
+            if text_lines:
+                yield f"{counter}\n{timing}\n" + "\n".join(text_lines) + "\n\n"
+                counter += 1
+            timing = None
+            text_lines = []
+
+        if is_timing:
+            t = VTT_TIMESTAMP.findall(line)
+            if len(t) >= 2:
+                timing = f"{srt_timestamp(t[0])} --> {srt_timestamp(t[1])}"
+        elif timing:
+            clean = VTT_TAG.sub("", line)
+            if clean:
+                text_lines.append(clean)
+
+
+def write_srt(lines, srt_path):
+    tmp_path = srt_path + ".tmp"
+    cues = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            hasher = StreamHasher(f)
+            for cue in iter_srt_cues(lines):
+                hasher.write(cue.encode("utf-8"))
+                cues += 1
+    except Exception:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+    if not cues:
+        os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, srt_path)
+    return hasher.result(cues=cues)
+
+
+@profiled("subtitles")
+def download_subtitles(url, srt_path, policy=None):
+    policy = policy or RetryPolicy()
+    print(f"\n{Color.YELLOW}   [*] Descarregant subtítols: {srt_path}{Color.END}")
+
+    for attempt in range(Config.MAX_RETRIES):
+        started = time.time()
+        try:
+            with http_open(url) as response:
+                lines = (line.decode("utf-8") for line in iter(response.readline, b""))
+                integrity = write_srt(lines, srt_path)
+            break
+        except Exception as e:
+            EVENTS.emit(
+                "retry",
+                name=os.path.basename(srt_path),
+                url=url,
+                attempt=attempt + 1,
+                error=str(e),
+            )
+            if not policy.retry(attempt, e):
+                print(f"{Color.RED}   [!] Error: {e}{Color.END}")
+                raise DownloadError(str(e))
+
+    EVENTS.emit(
+        "file",
+        name=os.path.basename(srt_path),
+        mode="srt",
+        bytes=integrity["size"] if integrity else 0,
+        seconds=round(time.time() - started, 3),
+    )
+    if not integrity:
+        print(
+            f"       {Color.YELLOW}[!] El fitxer de subtítols no conté cap línia; no s'ha generat l'SRT.{Color.END}"
+        )
+        return False
+    print(
+        f"       {Color.GREEN}✔ Subtítols SRT generats correctament ({integrity['cues']} entrades).{Color.END}"
+    )
+    return integrity
+
+
+def get_option_height(label):
+    match = re.search(r"(\d+)", str(label or ""))
+    return int(match.group(1)) if match else 0
+
+
+def build_options(sources, subtitols, variants, m_type, ffmpeg_disponible):
+    available_options = []
+    for s in sources:
+        if s.get("label") == "DASH":
+            mpd_url = s.get("file")
+            manifest = get_manifest(mpd_url)
+            a_rep = manifest["audio"][0] if manifest["audio"] else None
+
+            if (ffmpeg_disponible or Config.MUXER != "ffmpeg") and a_rep is not None:
+                for v in manifest["video"]:
+                    q_label = get_quality_label(v["width"], v["height"])
+                    available_options.append(
+                        {
+                            "type": "DASH_VIDEO",
+                            "label": f"Vídeo - {q_label}",
+                            "tag": f"{Color.CYAN}[Descàrrega DASH]{Color.END}",
+                            "url": mpd_url,
+                            "height": int(v["height"] or 0),
+                            "v_rep": v,
+                            "a_rep": a_rep,
+                        }
+                    )
+
+            if a_rep is not None:
+                available_options.append(
+                    {
+                        "type": "DASH_AUDIO",
+                        "label": "Àudio",
+                        "tag": f"{Color.GREEN}[Descàrrega DASH]{Color.END}",
+                        "url": mpd_url,
+                        "height": 0,
+                        "a_rep": a_rep,
+                    }
+                )
+
+        elif s.get("label") != "DASH":
+            q_label = get_quality_label(None, None, s.get("label"))
+            tag_color = Color.GREEN if m_type == "audio" else Color.BLUE
+            available_options.append(
+                {
+                    "type": "DIRECT",
+                    "label": f"{'Àudio' if m_type == 'audio' else 'Vídeo'} - {q_label}",
+                    "tag": f"{tag_color}[Descàrrega directa]{Color.END}",
+                    "url": s.get("file"),
+                    "height": get_option_height(s.get("label")),
+                }
+            )
+
+    for v in variants:
+        label = v.get("label", "Variant")
+        v_type_name = v.get("nom", "Variant")
+        v_sources = v.get("media", {}).get("url", [])
+        for vs in v_sources:
+            if vs.get("label") != "DASH":
+                q_label = get_quality_label(None, None, vs.get("label"))
+                available_options.append(
+                    {
+                        "type": "DIRECT",
+                        "label": f"{v_type_name} - {q_label}",
+                        "tag": f"{Color.MAGENTA}[{label}]{Color.END}",
+                        "url": vs.get("file"),
+                        "height": get_option_height(vs.get("label")),
+                        "suffix": f" ({v_type_name})",
+                        "variant": f"{label} {v_type_name}",
+                    }
+                )
+
+    for sub in subtitols:
+        available_options.append(
+            {
+                "type": "SUB",
+                "label": f"{sub.get('text')}",
+                "tag": f"{Color.BOLD}[Subtítols]{Color.END}",
+                "url": sub.get("url"),
+                "lang": sub.get("iso", "ca"),
+            }
+        )
+
+    return available_options
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    buffer = get_buffer()
+    with open(path, "rb") as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(buffer[:count])
+    return digest.hexdigest()
+
+
+def write_manifest(output, integrity):
+    size = os.path.getsize(output)
+    if size != integrity["size"]:
+        raise DownloadError(
+            f"La mida del fitxer ({size} bytes) no coincideix amb la descarregada ({integrity['size']} bytes)."
+        )
+    if not Config.INTEGRITY_MANIFEST:
+        return
+
+    manifest = dict(integrity, file=os.path.basename(output), verified=time.time())
+    tmp_path = f"{output}.integrity.json.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, f"{output}.integrity.json")
+
+
+def library_key(selected, media_id, m_type):
+    if selected["type"] == "DASH_VIDEO":
+        quality = f"{selected['v_rep']['id']}+{selected['a_rep']['id']}"
+    elif selected["type"] == "DASH_AUDIO":
+        quality = selected["a_rep"]["id"]
+    elif selected["type"] == "SUB":
+        quality = selected["lang"]
+    else:
+        quality = os.path.basename(urllib.parse.urlsplit(selected["url"]).path)
+    variant = selected.get("variant", "")
+    key = f"{m_type}:{media_id}:{selected['type']}:{quality}:{variant}"
+    return key, quality, variant
+
+
+def job_key(web_url, policy):
+    match = re.search(r"/(video|audio)/(\d+)/", web_url)
+    if not match:
+        return None
+    return f"{match.group(1)}:{match.group(2)}:{json.dumps(policy, sort_keys=True)}"
+
+
+class LibraryIndex:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)
+        self.db = None
+        self.reserved = {}
+
+    def connect(self):
+        if self.db is None:
+            import sqlite3
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    key TEXT PRIMARY KEY,
+                    media_id TEXT,
+                    media_type TEXT,
+                    quality TEXT,
+                    variant TEXT,
+                    path TEXT,
+                    size INTEGER,
+                    sha256 TEXT,
+                    created REAL
+                );
+                CREATE INDEX IF NOT EXISTS downloads_path ON downloads (path);
+                CREATE TABLE IF NOT EXISTS jobs (key TEXT PRIMARY KEY, results TEXT);
+                """)
+        return self.db
+
+    def lookup(self, key):
+        if not self.path:
+            return None
+        with self.lock:
+            row = (
+                self.connect()
+                .execute(
+                    "SELECT path, size, sha256 FROM downloads WHERE key = ?", (key,)
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+
+        path, size, sha256 = row
+        valid = os.path.isfile(path) and os.path.getsize(path) == size
+        if valid and Config.LIBRARY_VERIFY and sha256:
+            valid = file_sha256(path) == sha256
+        if not valid:
+            with self.lock:
+                self.db.execute("DELETE FROM downloads WHERE key = ?", (key,))
+                self.db.commit()
+            return None
+        return path
+
+    def record(self, key, media_id, media_type, quality, variant, path, sha256=None):
+        if not self.path:
+            return
+        path = os.path.abspath(path)
+        size = os.path.getsize(path)
+        if sha256 is None and Config.LIBRARY_VERIFY:
+            sha256 = file_sha256(path)
+        with self.lock:
+            self.connect().execute(
+                "DELETE FROM downloads WHERE path = ? AND key != ?", (path, key)
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    media_id,
+                    media_type,
+                    quality,
+                    variant,
+                    path,
+                    size,
+                    sha256,
+                    time.time(),
+                ),
+            )
+            self.db.commit()
+
+    def reserve(self, base_name, suffix, key, media_id):
+        with self.lock:
+            while key in self.reserved.values():
+                self.released.wait()
+            candidates = itertools.chain(
+                [f"{base_name}{suffix}", f"{base_name} [{media_id}]{suffix}"],
+                (f"{base_name} [{media_id}-{n}]{suffix}" for n in itertools.count(2)),
+            )
+            for candidate in candidates:
+                path = os.path.abspath(candidate)
+                if path in self.reserved:
+                    continue
+                if self.path:
+                    row = (
+                        self.connect()
+                        .execute(
+                            "SELECT media_id FROM downloads WHERE path = ?", (path,)
+                        )
+                        .fetchone()
+                    )
+                    if row and row[0] != media_id and os.path.exists(path):
+                        continue
+                self.reserved[path] = key
+                return candidate
+
+    def release(self, path):
+        with self.lock:
+            self.reserved.pop(os.path.abspath(path), None)
+            self.released.notify_all()
+
+    def lookup_job(self, key):
+        if not self.path or key is None:
+            return None
+        with self.lock:
+            row = (
+                self.connect()
+                .execute("SELECT results FROM jobs WHERE key = ?", (key,))
+                .fetchone()
+            )
+        if row is None:
+            return None
+
+        results = []
+        for entry in json.loads(row[0]):
+            output = self.lookup(entry.pop("key"))
+            if output is None:
+                return None
+            results.append(dict(entry, output=output, status="skipped", seconds=0))
+        return results
+
+    def record_job(self, key, entries):
+        if not self.path or key is None:
+            return
+        with self.lock:
+            self.connect().execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?)",
+                (key, json.dumps(entries, ensure_ascii=False)),
+            )
+            self.db.commit()
+
+
+LIBRARY = LibraryIndex(Config.LIBRARY_PATH)
+
+
+def library_setting():
+    value = os.environ.get(Config.LIBRARY_ENV, "").strip()
+    return os.path.expanduser(value) if value else Config.LIBRARY_PATH
+
+
+def run_option(
+    selected, media_id, titol, total_sec, m_type, output_dir="", cancelled=None
+):
+    key, quality, variant = library_key(selected, media_id, m_type)
+    if selected["type"] == "SUB":
+        suffix = f".{selected['lang']}.srt"
+    elif selected["type"] == "DIRECT":
+        ext = ".mp3" if m_type == "audio" else ".mp4"
+        suffix = f"{selected.get('suffix', '')}{ext}"
+    elif selected["type"] == "DASH_AUDIO":
+        suffix = ".m4a"
+    else:
+        suffix = ".mp4"
+    output = LIBRARY.reserve(os.path.join(output_dir, titol), suffix, key, media_id)
+    try:
+        existing = LIBRARY.lookup(key)
+        if existing:
+            print(f"\n   {Color.GRAY}[=] Ja descarregat: {existing}{Color.END}")
+            return {"output": existing, "status": "skipped"}
+
+        integrity = download_option(
+            selected, media_id, total_sec, output, output_dir, cancelled
+        )
+        if integrity is False:
+            return {"output": None, "status": "ok"}
+        if integrity:
+            write_manifest(output, integrity)
+        LIBRARY.record(
+            key,
+            media_id,
+            m_type,
+            quality,
+            variant,
+            output,
+            integrity and integrity.get("sha256"),
+        )
+    finally:
+        LIBRARY.release(output)
+    return {"output": output, "status": "ok"}
+
+
+def download_option(selected, media_id, total_sec, output, output_dir, cancelled=None):
+    policy = RetryPolicy(cancelled=cancelled)
+
+    integrity = None
+    if selected["type"] == "SUB":
+        integrity = download_subtitles(selected["url"], output, policy)
+
+    elif selected["type"] == "DIRECT":
+        integrity = download_file(selected["url"], output, policy)
+
+    elif selected["type"] == "DASH_AUDIO":
+        init_url, urls = segment_urls(selected["a_rep"], total_sec)
+        integrity = download_segments(init_url, urls, output, policy=policy)
+
+    elif selected["type"] == "DASH_VIDEO":
+        video = segment_urls(selected["v_rep"], total_sec)
+        audio = segment_urls(selected["a_rep"], total_sec)
+
+        v_temp = os.path.join(output_dir, f"v_{media_id}.tmp")
+        a_temp = os.path.join(output_dir, f"a_{media_id}.tmp")
+        resuming = has_checkpoint(v_temp) or has_checkpoint(a_temp)
+        if use_builtin_muxer() and not resuming:
+            integrity = mux_builtin(video, audio, output, policy=policy)
+        elif can_stream_mux() and not resuming:
+            integrity = mux_streaming(video, audio, output, policy=policy)
+        elif use_builtin_muxer():
+            download_segments(*video, v_temp, policy=policy)
+            download_segments(*audio, a_temp, policy=policy)
+            print(f"\n   {Color.YELLOW}[*] Combinant pistes...{Color.END}")
+            mux_started = time.time()
+            integrity = merge_tracks(v_temp, a_temp, output)
+            EVENTS.emit(
+                "mux",
+                output=output,
+                mode="builtin",
+                seconds=round(time.time() - mux_started, 3),
+            )
+            os.remove(v_temp)
+            os.remove(a_temp)
+        else:
+            tracks = {
+                "video": download_segments(*video, v_temp, policy=policy),
+                "audio": download_segments(*audio, a_temp, policy=policy),
+            }
+            print(f"\n   {Color.YELLOW}[*] Combinant pistes amb FFmpeg...{Color.END}")
+            mux_started = time.time()
+            ffmpeg_merge(v_temp, a_temp, output)
+            EVENTS.emit(
+                "mux",
+                output=output,
+                mode="ffmpeg",
+                seconds=round(time.time() - mux_started, 3),
+            )
+            os.remove(v_temp)
+            os.remove(a_temp)
+            integrity = {"size": os.path.getsize(output), "tracks": tracks}
+        print(f"   {Color.GREEN}✔ Vídeo finalitzat amb èxit.{Color.END}")
+    return integrity
+
+
+def main():
+    ffmpeg_disponible = check_ffmpeg()
+    LIBRARY.path = Config.LIBRARY_PATH = library_setting()
+
+    while True:
+        print_header()
+
+        print(
+            f"   {Color.BOLD}Introduïu la URL del contingut (o 's' per sortir):{Color.END}"
+        )
+        web_url = input(f"\n   {Color.GREEN}URL > {Color.END}").strip()
+
+        if web_url.lower() == "s":
+            print_exit_message()
+            break
+        if not web_url:
+            continue
+
+        try:
+            media_id, titol, total_sec, sources, subtitols, variants, m_type, _ = (
+                get_media_data(web_url)
+            )
+
+            while True:
+                print_header()
+                print(
+                    f"   {Color.BOLD}Contingut:{Color.END} {Color.YELLOW}{titol}{Color.END}"
+                )
+
+                available_options = build_options(
+                    sources, subtitols, variants, m_type, ffmpeg_disponible
+                )
+
+                print(
+                    f"\n   {Color.BOLD}Seleccioneu una opció de descàrrega:{Color.END}\n"
+                )
+                for i, opt in enumerate(available_options, start=1):
+                    print(f"    {i:2}. {opt['tag']} {opt['label']}")
+
+                new_search_idx = len(available_options) + 1
+                exit_idx = len(available_options) + 2
+                print(f"    {new_search_idx:2}. {Color.YELLOW}[Nova cerca]{Color.END}")
+                print(f"    {exit_idx:2}. {Color.RED}[Sortir del programa]{Color.END}")
+
+                try:
+                    choice_str = input(
+                        f"\n   {Color.GREEN}Opció (1-{exit_idx}) > {Color.END}"
+                    )
+                    if not choice_str:
+                        continue
+                    choice = int(choice_str)
+                except ValueError:
+                    continue
+
+                if choice == exit_idx:
+                    print_exit_message()
+                    return
+
+                if choice == new_search_idx:
+                    break
+
+                selected = available_options[choice - 1]
+
+                try:
+                    with PROGRESS.session():
+                        run_option(selected, media_id, titol, total_sec, m_type)
+                except DownloadError:
+                    sys.exit(1)
+
+                print_pool_stats()
+                input(f"\n   {Color.BOLD}Premeu INTRO per tornar al menú...{Color.END}")
 
         except Exception as e:
             print(f"\n   {Color.RED}[!] Error: {e}{Color.END}")
             input("\n   Premeu INTRO per tornar-ho a provar...")
 
 
+def pick_quality(candidates, quality):
+    if not candidates:
+        return None
+    if quality == "best":
+        return max(candidates, key=lambda o: (o["height"], o["type"] == "DIRECT"))
+    if quality == "worst":
+        return min(candidates, key=lambda o: (o["height"], o["type"] != "DIRECT"))
+
+    target = get_option_height(quality)
+    below = [o for o in candidates if o["height"] <= target]
+    if below:
+        return max(below, key=lambda o: (o["height"], o["type"] == "DIRECT"))
+    return min(candidates, key=lambda o: o["height"])
+
+
+THROUGHPUT = {}
+THROUGHPUT_LOCKS = {}
+THROUGHPUT_LOCK = threading.Lock()
+
+
+def read_probe(url, headers=None, limit=None):
+    received = 0
+    with http_open(url, headers) as response:
+        while limit is None or received < limit:
+            size = Config.BLOCK_SIZE if limit is None else limit - received
+            chunk = response.read(min(size, Config.BLOCK_SIZE))
+            if not chunk:
+                break
+            received += len(chunk)
+    return received
+
+
+def measure_throughput(urls, headers=None, limit=None):
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, len(urls))) as pool:
+        sizes = list(pool.map(lambda url: read_probe(url, headers, limit), urls))
+    return sum(sizes) / max(time.time() - started, 1e-6)
+
+
+def probe_throughput(option, total_sec=0):
+    host = urllib.parse.urlsplit(option["url"]).hostname
+    with THROUGHPUT_LOCK:
+        lock = THROUGHPUT_LOCKS.setdefault(host, threading.Lock())
+
+    with lock:
+        cached = THROUGHPUT.get(host)
+        if cached and time.monotonic() - cached[0] < Config.PROBE_TTL:
+            return cached[1]
+        try:
+            if option["type"] in ("DASH_VIDEO", "DASH_AUDIO"):
+                rep = option.get("v_rep") or option["a_rep"]
+                urls = segment_urls(rep, total_sec)[1][: Config.PROBE_SEGMENTS]
+                throughput = measure_throughput(urls) if urls else 0
+            else:
+                headers = {"Range": f"bytes=0-{Config.PROBE_BYTES - 1}"}
+                throughput = measure_throughput(
+                    [option["url"]], headers, Config.PROBE_BYTES
+                )
+        except Exception as e:
+            print(
+                f"   {Color.YELLOW}[!] No s'ha pogut mesurar la velocitat amb {host}: {e}{Color.END}"
+            )
+            return 0
+        if not throughput:
+            return 0
+        THROUGHPUT[host] = (time.monotonic(), throughput)
+        print(
+            f"   {Color.GRAY}Velocitat mesurada amb {host}: {throughput / 1048576:.1f} MB/s.{Color.END}"
+        )
+        return throughput
+
+
+def estimate_size(option, total_sec):
+    if option["type"] == "DASH_VIDEO":
+        return (
+            (option["v_rep"]["bandwidth"] + option["a_rep"]["bandwidth"])
+            * total_sec
+            / 8
+        )
+    if option["type"] == "DASH_AUDIO":
+        return option["a_rep"]["bandwidth"] * total_sec / 8
+    probe = probe_ranges(option["url"])
+    return probe[0] if probe else None
+
+
+def pick_adaptive(candidates, total_sec):
+    if not candidates:
+        return None
+    target = Config.TARGET_TIME or total_sec
+    ranked = sorted(
+        candidates, key=lambda o: (o["height"], o["type"] == "DIRECT"), reverse=True
+    )
+    probe_option = max(
+        ranked,
+        key=lambda o: (
+            o["type"] != "DIRECT",
+            o.get("v_rep", o.get("a_rep", {})).get("bandwidth", 0),
+        ),
+    )
+    throughput = probe_throughput(probe_option, total_sec)
+    if not throughput:
+        return pick_quality(candidates, "best")
+    if BANDWIDTH.rate:
+        throughput = min(throughput, BANDWIDTH.rate)
+
+    for option in ranked:
+        size = estimate_size(option, total_sec)
+        if size is not None and size / throughput <= target:
+            print(
+                f"   {Color.GRAY}Qualitat triada: {option['label']} (~{size / throughput:.1f} s).{Color.END}"
+            )
+            return option
+    return ranked[-1]
+
+
+def select_options(options, policy, m_type, total_sec=0):
+    chosen = []
+
+    if policy["format"] != "none":
+        if policy["variant"]:
+            name = policy["variant"].lower()
+            candidates = [o for o in options if name in o.get("variant", "").lower()]
+        elif policy["format"] == "audio" and m_type == "video":
+            candidates = [o for o in options if o["type"] == "DASH_AUDIO"]
+        else:
+            candidates = [
+                o
+                for o in options
+                if o["type"] in ("DASH_VIDEO", "DIRECT") and not o.get("variant")
+            ]
+
+        if policy["quality"] == "auto":
+            selected = pick_adaptive(candidates, total_sec)
+        else:
+            selected = pick_quality(candidates, policy["quality"])
+        if selected is None:
+            raise Exception("Cap opció de descàrrega coincideix amb la selecció.")
+        chosen.append(selected)
+
+    for o in options:
+        if o["type"] == "SUB" and (
+            "all" in policy["subs"] or o["lang"] in policy["subs"]
+        ):
+            chosen.append(o)
+
+    return chosen
+
+
+MEDIA_URL_PATTERN = re.compile(r"/(?:video|audio)/(\d+)/")
+MEDIA_LINK_PATTERN = re.compile(r"""[\w./:-]*/(?:video|audio)/\d+/""")
+
+
+NEXT_PAGE_PATTERN = re.compile(r"""<(?:a|link)\b[^>]*\brel=["']?next\b[^>]*>""")
+HREF_PATTERN = re.compile(r"""\bhref=["']([^"']+)["']""")
+
+
+def next_page_url(page_url, html):
+    tag = NEXT_PAGE_PATTERN.search(html)
+    href = tag and HREF_PATTERN.search(tag.group(0))
+    if not href:
+        return None
+    return urllib.parse.urljoin(page_url, href.group(1).replace("&amp;", "&"))
+
+
+def expand_programme(page_url):
+    urls = []
+    seen = set()
+    pages = set()
+    while page_url and page_url not in pages and len(pages) < Config.MAX_PAGES:
+        pages.add(page_url)
+        with http_open(page_url) as response:
+            html = response.read().decode("utf-8", "replace")
+
+        for link in MEDIA_LINK_PATTERN.findall(html):
+            url = urllib.parse.urljoin(page_url, link)
+            key = MEDIA_URL_PATTERN.search(url).group(0)
+            if key not in seen:
+                seen.add(key)
+                urls.append(url)
+        page_url = next_page_url(page_url, html)
+
+    if not urls:
+        raise Exception("No s'ha trobat cap contingut a la pàgina del programa.")
+    return urls
+
+
+def capture_errors(func):
+    def wrapper(*args):
+        try:
+            return func(*args)
+        except Exception as e:
+            return e
+
+    return wrapper
+
+
+def expand_urls(urls):
+    pages = [u for u in urls if not MEDIA_URL_PATTERN.search(u)]
+    with ThreadPoolExecutor(max_workers=Config.METADATA_WORKERS) as pool:
+        expanded = dict(zip(pages, pool.map(capture_errors(expand_programme), pages)))
+
+    media_urls = []
+    errors = []
+    for url in urls:
+        if url not in expanded:
+            media_urls.append(url)
+        elif isinstance(expanded[url], Exception):
+            print(f"{Color.RED}   [!] Error ({url}): {expanded[url]}{Color.END}")
+            errors.append({"url": url, "status": "error", "error": str(expanded[url])})
+        else:
+            print(f"   {Color.GRAY}{url}: {len(expanded[url])} continguts.{Color.END}")
+            media_urls.extend(expanded[url])
+    unique = {}
+    for url in media_urls:
+        match = MEDIA_URL_PATTERN.search(url)
+        unique.setdefault(match.group(0) if match else url, url)
+    return list(unique.values()), errors
+
+
+def prepare_job(web_url, policy, ffmpeg_disponible):
+    media = get_media_data(web_url)
+    sources, subtitols, variants, m_type = media[3:7]
+    options = build_options(sources, subtitols, variants, m_type, ffmpeg_disponible)
+    chosen = select_options(options, policy, m_type, media[2])
+    main_option = next((o for o in chosen if o["type"] != "SUB"), None)
+    host_url = (main_option or (chosen[0] if chosen else {})).get("url") or web_url
+    return {
+        "url": web_url,
+        "key": job_key(web_url, policy),
+        "media": media,
+        "chosen": chosen,
+        "date": media[7],
+        "host": urllib.parse.urlsplit(host_url).hostname,
+    }
+
+
+def run_job(job, output_dir):
+    media_id, titol, total_sec, _, _, _, m_type, _ = job["media"]
+    web_url = job["url"]
+
+    def run_selected(selected):
+        started = time.time()
+        result = {
+            "url": web_url,
+            "media_id": media_id,
+            "title": titol,
+            "type": selected["type"],
+            "option": selected["label"],
+        }
+        try:
+            result.update(
+                run_option(
+                    selected,
+                    media_id,
+                    titol,
+                    total_sec,
+                    m_type,
+                    output_dir,
+                    job.get("cancelled"),
+                )
+            )
+        except Exception as e:
+            print(f"{Color.RED}   [!] Error ({web_url}): {e}{Color.END}")
+            result["status"] = "error"
+            result["error"] = str(e)
+        result["seconds"] = round(time.time() - started, 2)
+        EVENTS.emit("job", **result)
+        return result
+
+    chosen = [o for o in job["chosen"] if o["type"] != "SUB"]
+    results = [run_selected(o) for o in chosen]
+    subs = [o for o in job["chosen"] if o["type"] == "SUB"]
+    if subs:
+        with ThreadPoolExecutor(max_workers=Config.SUBTITLE_WORKERS) as pool:
+            results.extend(pool.map(run_selected, subs))
+
+    if all(r["status"] != "error" for r in results):
+        LIBRARY.record_job(
+            job["key"],
+            [
+                {
+                    "key": library_key(o, media_id, m_type)[0],
+                    "url": r["url"],
+                    "media_id": r["media_id"],
+                    "title": r["title"],
+                    "type": r["type"],
+                    "option": r["option"],
+                }
+                for o, r in zip(chosen + subs, results)
+            ],
+        )
+    return results
+
+
+class JobScheduler:
+    def __init__(self, workers, host_limit, persistent=False):
+        self.workers = max(1, workers)
+        self.host_limit = max(1, host_limit)
+        self.persistent = persistent
+        self.closed = False
+        self.cond = threading.Condition()
+        self.queue = []
+        self.active = {}
+        self.counter = itertools.count()
+
+    def submit(self, job, priority):
+        with self.cond:
+            self.queue.append((priority, next(self.counter), job))
+            self.queue.sort(key=lambda item: item[:2])
+            self.cond.notify()
+
+    def next_job(self):
+        with self.cond:
+            while not self.closed and (self.queue or self.persistent):
+                for i, (_, _, job) in enumerate(self.queue):
+                    if self.active.get(job["host"], 0) < self.host_limit:
+                        del self.queue[i]
+                        self.active[job["host"]] = self.active.get(job["host"], 0) + 1
+                        return job
+                self.cond.wait()
+            return None
+
+    def done(self, job):
+        with self.cond:
+            self.active[job["host"]] -= 1
+            self.cond.notify_all()
+
+    def remove(self, job):
+        with self.cond:
+            count = len(self.queue)
+            self.queue = [item for item in self.queue if item[2] is not job]
+            return len(self.queue) < count
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def run(self, func):
+        results = []
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                job = self.next_job()
+                if job is None:
+                    return
+                try:
+                    job_results = func(job)
+                finally:
+                    self.done(job)
+                with lock:
+                    results.extend(job_results)
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+
+def parse_emission_date(value):
+    import datetime
+
+    for parse in (
+        lambda v: datetime.datetime.fromisoformat(v.replace("Z", "+00:00")),
+        lambda v: datetime.datetime.strptime(v, "%d/%m/%Y %H:%M"),
+        lambda v: datetime.datetime.strptime(v, "%d/%m/%Y"),
+    ):
+        try:
+            return parse(value.strip()).timestamp()
+        except (AttributeError, ValueError):
+            continue
+    return None
+
+
+def job_priority(job, order):
+    timestamp = parse_emission_date(job["date"])
+    if order == "input":
+        return 0
+    if timestamp is None:
+        return math.inf
+    return -timestamp if order == "newest" else timestamp
+
+
+class JobStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = None
+
+    def connect(self):
+        if self.db is None:
+            import sqlite3
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.row_factory = sqlite3.Row
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT,
+                    policy TEXT,
+                    status TEXT,
+                    error TEXT,
+                    results TEXT,
+                    created REAL,
+                    updated REAL
+                )
+                """)
+        return self.db
+
+    def row_dict(self, row):
+        job = dict(row)
+        job["policy"] = json.loads(job["policy"])
+        job["results"] = json.loads(job["results"] or "[]")
+        return job
+
+    def add(self, url, policy):
+        now = time.time()
+        with self.lock:
+            cursor = self.connect().execute(
+                "INSERT INTO jobs (url, policy, status, created, updated) VALUES (?, ?, 'queued', ?, ?)",
+                (url, json.dumps(policy, ensure_ascii=False, sort_keys=True), now, now),
+            )
+            self.db.commit()
+        return cursor.lastrowid
+
+    def find_active(self, url, policy):
+        with self.lock:
+            row = (
+                self.connect()
+                .execute(
+                    "SELECT id FROM jobs WHERE url = ? AND policy = ? AND status IN ('queued', 'running') ORDER BY id",
+                    (url, json.dumps(policy, ensure_ascii=False, sort_keys=True)),
+                )
+                .fetchone()
+            )
+        return row[0] if row else None
+
+    def update(self, job_id, status, results=None, error=None):
+        with self.lock:
+            self.connect().execute(
+                "UPDATE jobs SET status = ?, results = ?, error = ?, updated = ? WHERE id = ?",
+                (
+                    status,
+                    json.dumps(results or [], ensure_ascii=False),
+                    error,
+                    time.time(),
+                    job_id,
+                ),
+            )
+            self.db.commit()
+
+    def get(self, job_id):
+        with self.lock:
+            row = (
+                self.connect()
+                .execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+                .fetchone()
+            )
+        return self.row_dict(row) if row else None
+
+    def list(self, status=None):
+        query = "SELECT * FROM jobs"
+        params = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self.lock:
+            rows = self.connect().execute(query + " ORDER BY id", params).fetchall()
+        return [self.row_dict(row) for row in rows]
+
+
+class DownloadDaemon:
+    def __init__(
+        self,
+        store,
+        policy,
+        ffmpeg_disponible,
+        output_dir,
+        workers,
+        host_jobs,
+        order="input",
+    ):
+        self.store = store
+        self.policy = policy
+        self.order = order
+        self.ffmpeg_disponible = ffmpeg_disponible
+        self.output_dir = output_dir
+        self.scheduler = JobScheduler(workers, host_jobs, persistent=True)
+        self.preparer = ThreadPoolExecutor(max_workers=Config.METADATA_WORKERS)
+        self.lock = threading.Lock()
+        self.submitting = threading.Lock()
+        self.pending = {}
+        self.stopping = False
+        self.thread = None
+
+    def start(self):
+        unfinished = self.store.list("running") + self.store.list("queued")
+        for job in sorted(unfinished, key=lambda job: job["id"]):
+            self.enqueue(job["id"], job["url"], job["policy"])
+        self.thread = threading.Thread(target=self.scheduler.run, args=(self.run,))
+        self.thread.start()
+
+    def stop(self):
+        self.stopping = True
+        self.scheduler.close()
+        with self.lock:
+            for entry in self.pending.values():
+                entry["cancelled"].set()
+        self.preparer.shutdown(wait=True, cancel_futures=True)
+        if self.thread:
+            self.thread.join()
+
+    def submit(self, request):
+        urls = request.get("urls") or [request.get("url")]
+        if not all(isinstance(u, str) and u for u in urls):
+            raise ValueError("Cal indicar 'url' o 'urls'.")
+        policy = dict(self.policy)
+        policy.update(
+            (k, request[k]) for k in ("format", "quality", "variant") if k in request
+        )
+        if "subs" in request:
+            subs = request["subs"]
+            if not isinstance(subs, list) or not all(isinstance(s, str) for s in subs):
+                raise ValueError("'subs' ha de ser una llista de codis d'idioma.")
+            policy["subs"] = subs
+
+        urls, errors = expand_urls(urls)
+        jobs = []
+        for url in urls:
+            with self.submitting:
+                job_id = self.store.find_active(url, policy)
+                if job_id is None:
+                    job_id = self.store.add(url, policy)
+                    self.enqueue(job_id, url, policy)
+            jobs.append(self.store.get(job_id))
+        return jobs, errors
+
+    def enqueue(self, job_id, url, policy):
+        entry = {"cancelled": threading.Event(), "job": None}
+        with self.lock:
+            self.pending[job_id] = entry
+        self.store.update(job_id, "queued")
+        self.preparer.submit(self.prepare, job_id, url, policy, entry)
+
+    def prepare(self, job_id, url, policy, entry):
+        cached = LIBRARY.lookup_job(job_key(url, policy))
+        if cached is not None:
+            self.finish(job_id, "done", cached)
+            return
+        try:
+            job = prepare_job(url, policy, self.ffmpeg_disponible)
+        except Exception as e:
+            print(f"{Color.RED}   [!] Error ({url}): {e}{Color.END}")
+            self.finish(job_id, "error", error=str(e))
+            return
+
+        job.update(id=job_id, cancelled=entry["cancelled"])
+        with self.lock:
+            if entry["cancelled"].is_set():
+                return
+            entry["job"] = job
+            self.scheduler.submit(job, job_priority(job, self.order))
+
+    def run(self, job):
+        if job["cancelled"].is_set():
+            self.finish(job["id"], "cancelled")
+            return []
+        self.store.update(job["id"], "running")
+        results = run_job(job, self.output_dir)
+        if self.stopping:
+            return []
+        if job["cancelled"].is_set():
+            status = "cancelled"
+        elif any(r["status"] == "error" for r in results):
+            status = "error"
+        else:
+            status = "done"
+        self.finish(job["id"], status, results)
+        return []
+
+    def finish(self, job_id, status, results=None, error=None):
+        with self.lock:
+            entry = self.pending.pop(job_id, None)
+        if entry is not None and not self.stopping:
+            self.store.update(job_id, status, results, error)
+
+    def cancel(self, job_id):
+        with self.lock:
+            entry = self.pending.get(job_id)
+            if entry is not None:
+                entry["cancelled"].set()
+                if entry["job"] is None or self.scheduler.remove(entry["job"]):
+                    del self.pending[job_id]
+                    self.store.update(job_id, "cancelled")
+        return self.store.get(job_id)
+
+    def status(self):
+        counts = {}
+        for job in self.store.list():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"jobs": counts, "connections": dict(HTTP_POOL.stats)}
+
+
+def daemon_handler():
+    from http.server import BaseHTTPRequestHandler
+
+    class DaemonHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def job_id(self):
+            match = re.fullmatch(r"/jobs/(\d+)", self.path.split("?", 1)[0])
+            return int(match.group(1)) if match else None
+
+        def do_GET(self):
+            downloader = self.server.downloader
+            url = urllib.parse.urlsplit(self.path)
+            if url.path == "/status":
+                self.send_json(200, downloader.status())
+            elif url.path == "/jobs":
+                status = urllib.parse.parse_qs(url.query).get("status", [None])[0]
+                self.send_json(200, {"jobs": downloader.store.list(status)})
+            elif self.job_id() is not None:
+                job = downloader.store.get(self.job_id())
+                if job is None:
+                    self.send_json(404, {"error": "Feina no trobada."})
+                else:
+                    self.send_json(200, job)
+            else:
+                self.send_json(404, {"error": "Ruta desconeguda."})
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                self.send_json(404, {"error": "Ruta desconeguda."})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                jobs, errors = self.server.downloader.submit(request)
+            except (ValueError, AttributeError, TypeError) as e:
+                self.send_json(400, {"error": str(e)})
+                return
+            self.send_json(202, {"jobs": jobs, "errors": errors})
+
+        def do_DELETE(self):
+            job = None
+            if self.job_id() is not None:
+                job = self.server.downloader.cancel(self.job_id())
+            if job is None:
+                self.send_json(404, {"error": "Feina no trobada."})
+            else:
+                self.send_json(200, job)
+
+        def log_message(self, format, *args):
+            print(f"   {Color.GRAY}[API] {format % args}{Color.END}")
+
+    return DaemonHandler
+
+
+def serve(address, policy, ffmpeg_disponible, args, urls):
+    host, _, port = address.rpartition(":")
+    downloader = DownloadDaemon(
+        JobStore(args.state),
+        policy,
+        ffmpeg_disponible,
+        args.output_dir,
+        args.jobs,
+        args.host_jobs,
+        args.order,
+    )
+    from http.server import ThreadingHTTPServer
+
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), daemon_handler())
+    server.daemon_threads = True
+    server.downloader = downloader
+
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt()
+
+    signal.signal(signal.SIGTERM, interrupt)
+    downloader.start()
+    if urls:
+        downloader.submit({"urls": urls})
+    print(
+        f"{Color.GREEN}Servei escoltant a http://{server.server_address[0]}:{server.server_port}/{Color.END}"
+    )
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"{Color.GRAY}Aturant el servei...{Color.END}")
+        downloader.stop()
+    return 0
+
+
+def read_urls(args):
+    urls = list(args.urls)
+    if args.input:
+        f = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+        with f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    urls.append(line)
+    return urls
+
+
+def disable_colors():
+    for name in dir(Color):
+        if name.isupper():
+            setattr(Color, name, "")
+
+
+def parse_rate(value):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmM]?)", value.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"velocitat no vàlida: {value}")
+    factor = {"": 1, "k": 1024, "m": 1024 * 1024}[match.group(2).lower()]
+    return int(float(match.group(1)) * factor)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Descarrega continguts de 3Cat sense el menú interactiu."
+    )
+    parser.add_argument(
+        "urls",
+        nargs="*",
+        help="URL dels continguts de 3Cat o de la pàgina d'un programa",
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        help="fitxer amb una URL per línia ('-' per a l'entrada estàndard)",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=("video", "audio", "none"),
+        default="video",
+        help="què cal descarregar del contingut principal (per defecte: video)",
+    )
+    parser.add_argument(
+        "-q",
+        "--quality",
+        default="best",
+        help="'best', 'worst', 'auto' (segons la velocitat mesurada) o una alçada màxima com '720p' (per defecte: best)",
+    )
+    parser.add_argument(
+        "--target-time",
+        type=float,
+        help="amb '-q auto', temps màxim de descàrrega de cada contingut en segons (per defecte: la seva durada)",
+    )
+    parser.add_argument(
+        "--limit-rate",
+        type=parse_rate,
+        default=Config.MAX_BANDWIDTH,
+        help="límit d'amplada de banda total, en bytes per segon (admet K i M, p. ex. '2M')",
+    )
+    parser.add_argument(
+        "--variant", help="nom de la variant (p. ex. 'Audiodescripció')"
+    )
+    parser.add_argument(
+        "-s",
+        "--subs",
+        action="append",
+        default=[],
+        metavar="IDIOMA",
+        help="codi d'idioma dels subtítols o 'all' (es pot repetir)",
+    )
+    parser.add_argument("-o", "--output-dir", default="", help="carpeta de destinació")
+    parser.add_argument(
+        "--order",
+        choices=("newest", "oldest", "input"),
+        default="newest",
+        help="ordre de descàrrega segons la data d'emissió (per defecte: newest)",
+    )
+    parser.add_argument(
+        "--host-jobs",
+        type=int,
+        default=Config.HOST_JOBS,
+        help="continguts descarregats alhora des d'un mateix servidor (per defecte: 2)",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="continguts descarregats alhora"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=Config.SEGMENT_WORKERS,
+        help="connexions per pista DASH",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=Config.RANGE_CONNECTIONS,
+        help="connexions per fitxer en descàrregues directes",
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=Config.BLOCK_SIZE // 1024,
+        help="mida dels blocs de lectura en KiB (per defecte: 1024)",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=Config.POOL_SIZE,
+        help="connexions persistents per servidor",
+    )
+    parser.add_argument(
+        "--muxer",
+        choices=("auto", "builtin", "ffmpeg"),
+        default=Config.MUXER,
+        help="com es combinen les pistes DASH de vídeo i àudio (per defecte: FFmpeg si està disponible, si no el combinador intern)",
+    )
+    parser.add_argument(
+        "--library",
+        nargs="?",
+        const=Config.DEFAULT_LIBRARY_PATH,
+        default=library_setting(),
+        help=f"registra les descàrregues en una base de dades SQLite i omet les ja fetes (sense fitxer: {Config.DEFAULT_LIBRARY_PATH}; també amb la variable {Config.LIBRARY_ENV})",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="comprova el SHA-256 dels fitxers ja descarregats abans d'ometre'ls",
+    )
+    parser.add_argument(
+        "--no-progress",
+        dest="progress",
+        action="store_false",
+        help="no mostris el progrés (barres en un terminal, línies periòdiques si no)",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="CARPETA",
+        help="desa un perfil cProfile i el pic de memòria de cada fase (metadades, manifest, descàrrega, fusió i subtítols)",
+    )
+    parser.add_argument(
+        "--no-manifest",
+        dest="manifest",
+        action="store_false",
+        help="no desis el fitxer .integrity.json amb la mida i el SHA-256 de cada descàrrega",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="[ADREÇA:]PORT",
+        help="executa l'eina com a servei amb una API HTTP/JSON local per gestionar les descàrregues",
+    )
+    parser.add_argument(
+        "--state",
+        default=Config.DAEMON_PATH,
+        help="base de dades SQLite on el servei desa l'estat de les feines",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=Config.MAX_RETRIES,
+        help="intents per petició (per defecte: 5)",
+    )
+    parser.add_argument(
+        "--retry-budget",
+        type=int,
+        default=Config.RETRY_BUDGET,
+        help="reintents totals permesos per contingut (per defecte: 30)",
+    )
+    parser.add_argument(
+        "--hedge",
+        type=float,
+        default=Config.HEDGE_PERCENTILE,
+        help="percentil de latència a partir del qual es repeteix un segment lent, p. ex. 0.95 (per defecte: 0, desactivat)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="carpeta per desar la memòria cau de metadades entre execucions",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=Config.CACHE_TTL,
+        help="segons de validesa de la memòria cau (per defecte: 3600)",
+    )
+    parser.add_argument(
+        "--segment-cache",
+        help="carpeta on es desen els segments DASH per reaprofitar-los entre qualitats i variants",
+    )
+    parser.add_argument(
+        "--segment-cache-size",
+        type=int,
+        default=Config.SEGMENT_CACHE_SIZE // 1048576,
+        help="mida màxima de la memòria cau de segments en MB (per defecte: 2048)",
+    )
+    parser.add_argument(
+        "--events",
+        help="fitxer JSON Lines on s'escriuen els esdeveniments de cada descàrrega ('-' per a la sortida d'error)",
+    )
+    parser.add_argument(
+        "--summary",
+        help="fitxer JSON amb el resum de la feina ('-' per a la sortida estàndard)",
+    )
+    return parser.parse_args(argv)
+
+
+def run_batch(argv):
+    args = parse_args(argv)
+    urls = read_urls(args)
+    if not urls and not args.serve:
+        print("No s'ha indicat cap URL.", file=sys.stderr)
+        return 2
+
+    Config.SEGMENT_WORKERS = max(1, args.workers)
+    Config.RANGE_CONNECTIONS = max(1, args.connections)
+    Config.BLOCK_SIZE = max(16, args.block_size) * 1024
+    HTTP_POOL.size = Config.POOL_SIZE = max(1, args.pool_size)
+    Config.MUXER = args.muxer
+    Config.TARGET_TIME = args.target_time
+    Config.MAX_BANDWIDTH = args.limit_rate
+    BANDWIDTH.configure(Config.MAX_BANDWIDTH)
+    LIBRARY.path = Config.LIBRARY_PATH = args.library
+    Config.LIBRARY_VERIFY = args.verify
+    Config.INTEGRITY_MANIFEST = args.manifest
+    Config.MAX_RETRIES = max(1, args.retries)
+    Config.RETRY_BUDGET = max(0, args.retry_budget)
+    Config.HEDGE_PERCENTILE = min(max(0, args.hedge), 0.99)
+    METADATA_CACHE.ttl = Config.CACHE_TTL = args.cache_ttl
+    METADATA_CACHE.cache_dir = Config.CACHE_DIR = args.cache_dir
+    SEGMENT_CACHE.cache_dir = Config.SEGMENT_CACHE_DIR = args.segment_cache
+    SEGMENT_CACHE.max_bytes = Config.SEGMENT_CACHE_SIZE = (
+        args.segment_cache_size * 1048576
+    )
+    interactive_output = sys.stdout.isatty() and args.summary != "-"
+    Config.SHOW_PROGRESS = args.progress
+    if not interactive_output:
+        disable_colors()
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    policy = {
+        "format": args.format,
+        "quality": args.quality,
+        "variant": args.variant,
+        "subs": args.subs,
+    }
+    ffmpeg_disponible = check_ffmpeg()
+    EVENTS.open(args.events)
+    if args.profile:
+        PROFILER.enable(args.profile)
+    if args.serve:
+        try:
+            with PROGRESS.session():
+                return serve(args.serve, policy, ffmpeg_disponible, args, urls)
+        finally:
+            EVENTS.close()
+            PROFILER.save()
+    started = time.time()
+
+    log_stream = sys.stderr if args.summary == "-" else sys.stdout
+    with contextlib.redirect_stdout(log_stream):
+        urls, results = expand_urls(urls)
+
+        pending = []
+        for url in urls:
+            cached = LIBRARY.lookup_job(job_key(url, policy))
+            if cached is None:
+                pending.append(url)
+                continue
+            print(f"   {Color.GRAY}[=] Ja descarregat: {url}{Color.END}")
+            for result in cached:
+                EVENTS.emit("job", **result)
+            results.extend(cached)
+        urls = pending
+
+        def prepare(url):
+            return prepare_job(url, policy, ffmpeg_disponible)
+
+        with ThreadPoolExecutor(max_workers=Config.METADATA_WORKERS) as pool:
+            prepared = list(pool.map(capture_errors(prepare), urls))
+
+        scheduler = JobScheduler(args.jobs, args.host_jobs)
+        for url, job in zip(urls, prepared):
+            if isinstance(job, Exception):
+                print(f"{Color.RED}   [!] Error ({url}): {job}{Color.END}")
+                result = {"url": url, "status": "error", "error": str(job)}
+                EVENTS.emit("job", **result)
+                results.append(result)
+            else:
+                scheduler.submit(job, job_priority(job, args.order))
+
+        with PROGRESS.session():
+            results += scheduler.run(lambda job: run_job(job, args.output_dir))
+
+    failed = sum(1 for r in results if r["status"] == "error")
+    skipped = sum(1 for r in results if r["status"] == "skipped")
+    metrics = EVENTS.summary()
+    EVENTS.emit("summary", **metrics)
+    EVENTS.close()
+    with contextlib.redirect_stdout(log_stream):
+        print_metrics_summary(metrics)
+        PROFILER.save()
+
+    summary = {
+        "ok": len(results) - failed - skipped,
+        "skipped": skipped,
+        "failed": failed,
+        "seconds": round(time.time() - started, 2),
+        "connections": dict(HTTP_POOL.stats),
+        "metrics": metrics,
+        "results": results,
+    }
+    if args.summary == "-":
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    elif args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    return 1 if failed else 0
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_batch(sys.argv[1:]))
     main()
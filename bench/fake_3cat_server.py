@@ -0,0 +1,470 @@
+import argparse
+import functools
+import hashlib
+import json
+import random
+import re
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class Settings:
+    LATENCY = 0.0
+    BANDWIDTH = 0
+    FAILURE_RATE = 0.0
+    SEGMENT_SECONDS = 2
+    SEGMENTS = 60
+    VIDEO_SEGMENT_SIZE = 256 * 1024
+    AUDIO_SEGMENT_SIZE = 32 * 1024
+    DIRECT_SIZE = 32 * 1024 * 1024
+    EPISODES = 6
+    PAGE_SIZE = 4
+    SEED = 3
+
+
+REPRESENTATIONS = [
+    {
+        "id": "video_1080",
+        "kind": "video",
+        "width": 1920,
+        "height": 1080,
+        "bandwidth": 4000000,
+        "timescale": 90000,
+        "track": 1,
+    },
+    {
+        "id": "video_720",
+        "kind": "video",
+        "width": 1280,
+        "height": 720,
+        "bandwidth": 2000000,
+        "timescale": 90000,
+        "track": 1,
+    },
+    {
+        "id": "audio_128",
+        "kind": "audio",
+        "bandwidth": 128000,
+        "timescale": 48000,
+        "track": 1,
+    },
+]
+
+_PAYLOAD = bytes(random.Random(Settings.SEED).getrandbits(8) for _ in range(64 * 1024))
+
+
+@functools.lru_cache(maxsize=8)
+def payload(size, salt=0):
+    offset = salt % len(_PAYLOAD)
+    block = _PAYLOAD[offset:] + _PAYLOAD[:offset]
+    return (block * (size // len(block) + 1))[:size]
+
+
+def box(kind, body):
+    return struct.pack(">I", 8 + len(body)) + kind + body
+
+
+def full_box(kind, version, flags, body):
+    return box(kind, struct.pack(">I", (version << 24) | flags) + body)
+
+
+def init_segment(rep):
+    handler = b"vide" if rep["kind"] == "video" else b"soun"
+    track = rep["track"]
+    tkhd = full_box(b"tkhd", 0, 3, struct.pack(">IIIII", 0, 0, track, 0, 0) + bytes(60))
+    mdhd = full_box(
+        b"mdhd",
+        0,
+        0,
+        struct.pack(">IIII", 0, 0, rep["timescale"], 0) + b"\x55\xc4\x00\x00",
+    )
+    hdlr = full_box(b"hdlr", 0, 0, b"\x00" * 4 + handler + bytes(12) + b"3cat\x00")
+    stbl = box(
+        b"stbl",
+        full_box(b"stsd", 0, 0, struct.pack(">I", 0))
+        + full_box(b"stts", 0, 0, struct.pack(">I", 0))
+        + full_box(b"stsc", 0, 0, struct.pack(">I", 0))
+        + full_box(b"stsz", 0, 0, struct.pack(">II", 0, 0))
+        + full_box(b"stco", 0, 0, struct.pack(">I", 0)),
+    )
+    minf = box(b"minf", stbl)
+    trak = box(b"trak", tkhd + box(b"mdia", mdhd + hdlr + minf))
+    mvhd = full_box(
+        b"mvhd",
+        0,
+        0,
+        struct.pack(">IIII", 0, 0, 1000, 0) + bytes(76) + struct.pack(">I", track + 1),
+    )
+    trex = full_box(b"trex", 0, 0, struct.pack(">IIIII", track, 1, 0, 0, 0))
+    moov = box(b"moov", mvhd + trak + box(b"mvex", trex))
+    ftyp = box(b"ftyp", b"iso6\x00\x00\x02\x00iso6dash")
+    return ftyp + moov
+
+
+def media_segment(rep, number):
+    size = (
+        Settings.VIDEO_SEGMENT_SIZE
+        if rep["kind"] == "video"
+        else Settings.AUDIO_SEGMENT_SIZE
+    )
+    duration = Settings.SEGMENT_SECONDS * rep["timescale"]
+    mdat_body = payload(size, number * 7919 + rep["bandwidth"])
+    mfhd = full_box(b"mfhd", 0, 0, struct.pack(">I", number + 1))
+    tfhd = full_box(b"tfhd", 0, 0x020000, struct.pack(">I", rep["track"]))
+    tfdt = full_box(b"tfdt", 1, 0, struct.pack(">Q", number * duration))
+    trun_size = 8 + 4 + 4 + 4 + 8
+    traf_size = 8 + len(tfhd) + len(tfdt) + trun_size
+    moof_size = 8 + len(mfhd) + traf_size
+    trun = full_box(
+        b"trun", 0, 0x000301, struct.pack(">IiII", 1, moof_size + 8, duration, size)
+    )
+    moof = box(b"moof", mfhd + box(b"traf", tfhd + tfdt + trun))
+    return moof + box(b"mdat", mdat_body)
+
+
+def manifest(media_id):
+    total = Settings.SEGMENTS * Settings.SEGMENT_SECONDS
+    sets = []
+    for kind, mime in (("video", "video/mp4"), ("audio", "audio/mp4")):
+        reps = []
+        for rep in REPRESENTATIONS:
+            if rep["kind"] != kind:
+                continue
+            size = (
+                f' width="{rep["width"]}" height="{rep["height"]}"'
+                if kind == "video"
+                else ""
+            )
+            reps.append(
+                f'      <Representation id="{rep["id"]}" bandwidth="{rep["bandwidth"]}"{size}>\n'
+                f'        <SegmentTemplate timescale="{rep["timescale"]}" duration="{Settings.SEGMENT_SECONDS * rep["timescale"]}" '
+                f'startNumber="0" initialization="{rep["id"]}/init.mp4" media="{rep["id"]}/seg_$Number$.m4s"/>\n'
+                "      </Representation>\n"
+            )
+        sets.append(
+            f'    <AdaptationSet mimeType="{mime}">\n'
+            + "".join(reps)
+            + "    </AdaptationSet>\n"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{total}S">\n'
+        f'  <Period id="0" duration="PT{total}S">\n'
+        + "".join(sets)
+        + "  </Period>\n</MPD>\n"
+    ).encode()
+
+
+def timeline_manifest(media_id):
+    total = Settings.SEGMENTS * Settings.SEGMENT_SECONDS
+    sets = []
+    for kind, mime in (("video", "video/mp4"), ("audio", "audio/mp4")):
+        reps = [r for r in REPRESENTATIONS if r["kind"] == kind]
+        timescale = reps[0]["timescale"]
+        duration = Settings.SEGMENT_SECONDS * timescale
+        sets.append(
+            f'    <AdaptationSet contentType="{kind}" mimeType="{mime}">\n'
+            f'      <SegmentTemplate timescale="{timescale}" initialization="$RepresentationID$/init.mp4" '
+            'media="$RepresentationID$/t_$Time$.m4s">\n'
+            "        <SegmentTimeline>\n"
+            f'          <S t="0" d="{duration}" r="-1"/>\n'
+            "        </SegmentTimeline>\n"
+            "      </SegmentTemplate>\n"
+            + "".join(
+                f'      <Representation id="{r["id"]}" bandwidth="{r["bandwidth"]}"'
+                + (
+                    f' width="{r["width"]}" height="{r["height"]}"'
+                    if kind == "video"
+                    else ""
+                )
+                + "/>\n"
+                for r in reps
+            )
+            + "    </AdaptationSet>\n"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{total}S">\n'
+        f"  <BaseURL>/dash/{media_id}/</BaseURL>\n"
+        '  <Period id="0">\n' + "".join(sets) + "  </Period>\n</MPD>\n"
+    ).encode()
+
+
+def subtitles(media_id):
+    lines = ["WEBVTT", ""]
+    for i in range(Settings.SEGMENTS * Settings.SEGMENT_SECONDS // 2):
+        start, end = i * 2, i * 2 + 1
+        lines += [
+            str(i + 1),
+            f"00:{start // 60:02d}:{start % 60:02d}.000 --> 00:{end // 60:02d}:{end % 60:02d}.500 line:90%",
+            f"<c.yellow>Línia {i} del subtítol</c>",
+            "segona línia",
+            "",
+        ]
+    return "\n".join(lines).encode()
+
+
+def programme_page(slug, page=1):
+    items = []
+    first = (page - 1) * Settings.PAGE_SIZE
+    for i in range(first, min(first + Settings.PAGE_SIZE, Settings.EPISODES)):
+        media_id = 100 + i * 3
+        link = f"/3cat/{slug}/video/{media_id}/"
+        items.append(
+            f'    <li><a href="{link}"><img src="/img/{media_id}.jpg"></a>'
+            f'<a href="{link}">Capítol {i + 1}</a></li>\n'
+        )
+    pager = ""
+    if first + Settings.PAGE_SIZE < Settings.EPISODES:
+        pager = f'  <a rel="next" href="/3cat/{slug}/capitols/?pagina={page + 1}">Següent</a>\n'
+    return (
+        "<!DOCTYPE html>\n<html><body>\n"
+        f"  <h1>{slug}</h1>\n  <ul>\n"
+        + "".join(items)
+        + "  </ul>\n"
+        + pager
+        + "</body></html>\n"
+    ).encode()
+
+
+def media_json(host, media_type, media_id):
+    base = f"http://{host}"
+    if media_type == "audio":
+        sources = f"{base}/direct/{media_id}/audio.mp3"
+    else:
+        sources = [
+            {"label": "DASH", "file": f"{base}/dash/{media_id}/manifest.mpd"},
+            {"label": "720p", "file": f"{base}/direct/{media_id}/video_720.mp4"},
+        ]
+    return json.dumps(
+        {
+            "informacio": {
+                "titol": f"Episodi de prova {media_id}",
+                "durada": {
+                    "milisegons": Settings.SEGMENTS * Settings.SEGMENT_SECONDS * 1000
+                },
+                "data_emissio": {
+                    "utc": f"2024-01-{int(media_id) % 28 + 1:02d}T20:00:00Z"
+                },
+            },
+            "media": {"url": sources},
+            "subtitols": [
+                {
+                    "text": "Català",
+                    "iso": "ca",
+                    "url": f"{base}/subs/{media_id}.ca.vtt",
+                },
+                {
+                    "text": "Català (sords)",
+                    "iso": "ca-sor",
+                    "url": f"{base}/subs/{media_id}.ca-sor.vtt",
+                },
+            ],
+            "variants": [
+                {
+                    "label": "AD",
+                    "nom": "Audiodescripció",
+                    "media": {
+                        "url": [
+                            {
+                                "label": "720p",
+                                "file": f"{base}/direct/{media_id}/video_720_ad.mp4",
+                            }
+                        ]
+                    },
+                }
+            ],
+        }
+    ).encode()
+
+
+class Stats:
+    lock = threading.Lock()
+    requests = 0
+    failures = 0
+    bytes_sent = 0
+    connections = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "Fake3Cat/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with Stats.lock:
+            Stats.connections += 1
+
+    def do_HEAD(self):
+        self.handle_request(head=True)
+
+    def do_GET(self):
+        self.handle_request(head=False)
+
+    def handle_request(self, head):
+        with Stats.lock:
+            Stats.requests += 1
+        if Settings.LATENCY:
+            time.sleep(Settings.LATENCY)
+        if Settings.FAILURE_RATE and random.random() < Settings.FAILURE_RATE:
+            with Stats.lock:
+                Stats.failures += 1
+            self.send_error(503)
+            return
+
+        parsed = urlparse(self.path)
+        path = parsed.path
+        host = self.headers.get("Host", "127.0.0.1")
+        content_type = "application/octet-stream"
+
+        if path == "/pvideo/media.jsp":
+            query = parse_qs(parsed.query)
+            body = media_json(
+                host, query.get("media", ["video"])[0], query.get("idint", ["0"])[0]
+            )
+            content_type = "application/json"
+        elif m := re.fullmatch(r"/dash/(\d+)/manifest\.mpd", path):
+            body = manifest(m.group(1))
+            content_type = "application/dash+xml"
+        elif m := re.fullmatch(r"/dash/(\d+)/timeline\.mpd", path):
+            body = timeline_manifest(m.group(1))
+            content_type = "application/dash+xml"
+        elif m := re.fullmatch(r"/dash/(\d+)/(\w+)/init\.mp4", path):
+            rep = next((r for r in REPRESENTATIONS if r["id"] == m.group(2)), None)
+            if rep is None:
+                self.send_error(404)
+                return
+            body = init_segment(rep)
+        elif m := re.fullmatch(r"/dash/(\d+)/(\w+)/(seg|t)_(\d+)\.m4s", path):
+            rep = next((r for r in REPRESENTATIONS if r["id"] == m.group(2)), None)
+            number = int(m.group(4))
+            if rep is not None and m.group(3) == "t":
+                number //= Settings.SEGMENT_SECONDS * rep["timescale"]
+            if rep is None or number >= Settings.SEGMENTS:
+                self.send_error(404)
+                return
+            body = media_segment(rep, number)
+        elif m := re.fullmatch(r"/direct/(\d+)/(\w+)\.(mp4|mp3)", path):
+            body = payload(Settings.DIRECT_SIZE, int(m.group(1)))
+            content_type = "video/mp4" if m.group(3) == "mp4" else "audio/mpeg"
+        elif m := re.fullmatch(r"/3cat/([\w-]+)/(?:capitols/)?", path):
+            page = parse_qs(parsed.query).get("pagina", ["1"])[0]
+            body = programme_page(m.group(1), int(page))
+            content_type = "text/html; charset=utf-8"
+        elif m := re.fullmatch(r"/subs/(\d+)\.([\w-]+)\.vtt", path):
+            body = subtitles(m.group(1))
+            content_type = "text/vtt"
+        else:
+            self.send_error(404)
+            return
+
+        self.send_body(body, content_type, head)
+
+    def send_body(self, body, content_type, head):
+        etag = (
+            '"' + hashlib.md5(body[:4096] + str(len(body)).encode()).hexdigest() + '"'
+        )
+        start, end = 0, len(body) - 1
+        status = 200
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (not if_range or if_range == etag):
+            m = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header.strip())
+            if not m or int(m.group(1)) >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            start = int(m.group(1))
+            end = min(int(m.group(2)), len(body) - 1) if m.group(2) else len(body) - 1
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        self.end_headers()
+        if head:
+            return
+
+        view = memoryview(body)[start : end + 1]
+        chunk = 64 * 1024
+        try:
+            for offset in range(0, len(view), chunk):
+                piece = view[offset : offset + chunk]
+                self.wfile.write(piece)
+                if Settings.BANDWIDTH:
+                    time.sleep(len(piece) / Settings.BANDWIDTH)
+            with Stats.lock:
+                Stats.bytes_sent += len(view)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+def start_server(host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Servidor local que imita l'API i el CDN de 3Cat."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8033)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="segons d'espera per petició"
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=float,
+        default=0,
+        help="bytes/s per connexió (0 = il·limitat)",
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="proporció de peticions que fallen",
+    )
+    parser.add_argument("--segments", type=int, default=Settings.SEGMENTS)
+    parser.add_argument("--segment-size", type=int, default=Settings.VIDEO_SEGMENT_SIZE)
+    parser.add_argument("--direct-size", type=int, default=Settings.DIRECT_SIZE)
+    parser.add_argument("--episodes", type=int, default=Settings.EPISODES)
+    args = parser.parse_args()
+
+    Settings.LATENCY = args.latency
+    Settings.BANDWIDTH = args.bandwidth
+    Settings.FAILURE_RATE = args.failure_rate
+    Settings.SEGMENTS = args.segments
+    Settings.VIDEO_SEGMENT_SIZE = args.segment_size
+    Settings.DIRECT_SIZE = args.direct_size
+    Settings.EPISODES = args.episodes
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    host, port = server.server_address[:2]
+    print(f"Servint a http://{host}:{port}/ (Ctrl+C per aturar)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CLI_PATH = os.path.join(os.path.dirname(BENCH_DIR), "3cat_media_downloader_cli.py")
+SERVER_PATH = os.path.join(BENCH_DIR, "fake_3cat_server.py")
+
+
+def load_cli():
+    spec = importlib.util.spec_from_file_location("cat_cli", CLI_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def start_server(args):
+    command = [
+        sys.executable,
+        SERVER_PATH,
+        "--port",
+        "0",
+        "--latency",
+        str(args.latency),
+        "--bandwidth",
+        str(args.bandwidth),
+        "--failure-rate",
+        str(args.failure_rate),
+        "--segments",
+        str(args.segments),
+        "--segment-size",
+        str(args.segment_size),
+        "--direct-size",
+        str(args.direct_size),
+    ]
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    match = re.search(r"http://[\w.]+:\d+", proc.stdout.readline())
+    if not match:
+        proc.kill()
+        raise RuntimeError("No s'ha pogut iniciar el servidor local.")
+
+    base = match.group(0)
+    warmup = urllib.request.Request(f"{base}/direct/7/video_720.mp4", method="HEAD")
+    urllib.request.urlopen(warmup).close()
+    return proc, base
+
+
+class Recorder:
+    def __init__(self, cli):
+        self.cli = cli
+        self.original_open = cli.http_open
+        self.ttfb = []
+
+    def http_open(self, url, headers=None, timeout=None, method="GET"):
+        started = time.perf_counter()
+        response = self.original_open(url, headers, timeout, method)
+        self.ttfb.append(time.perf_counter() - started)
+        return response
+
+    def __enter__(self):
+        self.ttfb = []
+        self.cli.http_open = self.http_open
+        return self
+
+    def __exit__(self, *exc):
+        self.cli.http_open = self.original_open
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(cli, name, func, nbytes_of):
+    recorder = Recorder(cli)
+    tracemalloc.start()
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    with recorder, contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    nbytes = nbytes_of(result)
+    return {
+        "name": name,
+        "seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "mb_per_s": round(nbytes / 1048576 / wall, 2) if nbytes else 0.0,
+        "requests": len(recorder.ttfb),
+        "requests_per_s": round(len(recorder.ttfb) / wall, 1),
+        "ttfb_ms": round(sum(recorder.ttfb) / max(1, len(recorder.ttfb)) * 1000, 2),
+        "ttfb_p95_ms": round(percentile(recorder.ttfb, 0.95) * 1000, 2),
+        "peak_mib": round(peak / 1048576, 2),
+    }
+
+
+def file_size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+def bench_metadata(cli, base, workdir, args):
+    def run():
+        for i in range(args.lookups):
+            cli.METADATA_CACHE.entries.clear()
+            cli.get_media_data(f"https://www.3cat.cat/3cat/bench/video/{1000 + i}/")
+
+    return measure(cli, "get_media_data", run, lambda _: 0)
+
+
+def bench_direct(cli, base, workdir, args, connections):
+    path = os.path.join(workdir, f"direct_{connections}.mp4")
+
+    def run():
+        cli.Config.RANGE_CONNECTIONS = connections
+        cli.download_file(f"{base}/direct/7/video_720.mp4", path)
+        return path
+
+    return measure(cli, f"download_file x{connections}", run, file_size)
+
+
+def bench_segments(cli, base, workdir, args):
+    path = os.path.join(workdir, "segments.tmp")
+
+    def run():
+        manifest = cli.get_manifest(f"{base}/dash/7/manifest.mpd")
+        init_url, urls = cli.segment_urls(manifest["video"][0])
+        cli.download_segments(init_url, urls, path)
+        return path
+
+    return measure(cli, "download_segments", run, file_size)
+
+
+def bench_subtitles(cli, base, workdir, args):
+    srt_path = os.path.join(workdir, "subs.ca.srt")
+
+    def run():
+        cli.download_subtitles(f"{base}/subs/7.ca.vtt", srt_path)
+        return srt_path
+
+    return measure(cli, "download_subtitles", run, file_size)
+
+
+def bench_startup(cli, base, workdir, args):
+    times = []
+    cpu_times = []
+    for _ in range(args.startups):
+        before = os.times()
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, CLI_PATH, "--help"],
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        times.append(time.perf_counter() - started)
+        after = os.times()
+        cpu_times.append(
+            after.children_user
+            - before.children_user
+            + after.children_system
+            - before.children_system
+        )
+
+    return {
+        "name": "startup (--help)",
+        "seconds": round(percentile(times, 0.5), 4),
+        "seconds_min": round(min(times), 4),
+        "cpu_seconds": round(percentile(cpu_times, 0.5), 4),
+    }
+
+
+def print_table(results):
+    header = f"{'Prova':<22}{'s':>8}{'MB/s':>9}{'req/s':>9}{'TTFB ms':>10}{'p95 ms':>9}{'pic MiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['name']:<22}{r['seconds']:>8.3f}{r.get('mb_per_s', 0):>9.2f}"
+            f"{r.get('requests_per_s', 0):>9.1f}{r.get('ttfb_ms', 0):>10.2f}"
+            f"{r.get('ttfb_p95_ms', 0):>9.2f}{r.get('peak_mib', 0):>9.2f}"
+        )
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Mesura el rendiment de l'eina contra un servidor local que imita 3Cat."
+    )
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--segments", type=int, default=120)
+    parser.add_argument("--segment-size", type=int, default=512 * 1024)
+    parser.add_argument("--direct-size", type=int, default=64 * 1024 * 1024)
+    parser.add_argument("--lookups", type=int, default=50)
+    parser.add_argument("--startups", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--retry-delay", type=float, default=0.1)
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=("startup", "metadata", "direct", "segments", "subtitles"),
+        help="executa només aquestes proves (es pot repetir)",
+    )
+    parser.add_argument("--json", help="desa els resultats en aquest fitxer JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    selected = set(
+        args.only or ("startup", "metadata", "direct", "segments", "subtitles")
+    )
+
+    cli = load_cli()
+    cli.Config.SHOW_PROGRESS = False
+    cli.Config.RETRY_BASE_DELAY = args.retry_delay
+    if args.workers:
+        cli.Config.SEGMENT_WORKERS = args.workers
+
+    proc, base = start_server(args)
+    cli.Config.API_URL = f"{base}/pvideo/media.jsp"
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            if "startup" in selected:
+                results.append(bench_startup(cli, base, workdir, args))
+            if "metadata" in selected:
+                results.append(bench_metadata(cli, base, workdir, args))
+            if "direct" in selected:
+                results.append(bench_direct(cli, base, workdir, args, 1))
+                if args.connections > 1:
+                    results.append(
+                        bench_direct(cli, base, workdir, args, args.connections)
+                    )
+            if "segments" in selected:
+                results.append(bench_segments(cli, base, workdir, args))
+            if "subtitles" in selected:
+                results.append(bench_subtitles(cli, base, workdir, args))
+    finally:
+        proc.kill()
+        proc.wait()
+
+    print_table(results)
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"\nMemòria màxima del procés: {max_rss:.0f} MiB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"settings": vars(args), "results": results},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
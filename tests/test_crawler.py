@@ -0,0 +1,101 @@
+import threading
+import time
+
+import fake_3cat_server as fake
+import pytest
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = fake.start_server()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def episode_ids(urls):
+    return [int(url.rstrip("/").rsplit("/", 1)[-1]) for url in urls]
+
+
+def test_expand_programme_follows_pages(cli, base_url):
+    urls = cli.expand_programme(f"{base_url}/3cat/prova/")
+
+    assert episode_ids(urls) == [100 + i * 3 for i in range(fake.Settings.EPISODES)]
+    assert all(url.startswith(f"{base_url}/3cat/prova/video/") for url in urls)
+
+
+def test_expand_programme_respects_max_pages(cli, base_url, monkeypatch):
+    monkeypatch.setattr(cli.Config, "MAX_PAGES", 1)
+    urls = cli.expand_programme(f"{base_url}/3cat/prova/")
+
+    assert len(urls) == fake.Settings.PAGE_SIZE
+
+
+def test_expand_urls_deduplicates_media(cli, base_url):
+    single = f"{base_url}/3cat/altre/video/103/"
+    urls, errors = cli.expand_urls(
+        [single, f"{base_url}/3cat/prova/", f"{base_url}/3cat/prova/capitols/"]
+    )
+
+    assert errors == []
+    assert urls[0] == single
+    assert sorted(episode_ids(urls)) == [
+        100 + i * 3 for i in range(fake.Settings.EPISODES)
+    ]
+
+
+def test_expand_urls_reports_broken_pages(cli, base_url):
+    urls, errors = cli.expand_urls(
+        [f"{base_url}/no-existeix/", f"{base_url}/3cat/prova/video/100/"]
+    )
+
+    assert episode_ids(urls) == [100]
+    assert [e["url"] for e in errors] == [f"{base_url}/no-existeix/"]
+    assert errors[0]["status"] == "error"
+
+
+def test_scheduler_respects_host_limit(cli):
+    scheduler = cli.JobScheduler(workers=6, host_limit=2)
+    for i in range(12):
+        scheduler.submit({"id": i, "host": "a" if i % 3 else "b"}, i)
+
+    lock = threading.Lock()
+    active = {}
+    peak = {}
+
+    def run(job):
+        with lock:
+            active[job["host"]] = active.get(job["host"], 0) + 1
+            peak[job["host"]] = max(peak.get(job["host"], 0), active[job["host"]])
+        time.sleep(0.02)
+        with lock:
+            active[job["host"]] -= 1
+        return [job["id"]]
+
+    results = scheduler.run(run)
+
+    assert sorted(results) == list(range(12))
+    assert peak == {"a": 2, "b": 2}
+
+
+def test_scheduler_runs_jobs_by_priority(cli):
+    scheduler = cli.JobScheduler(workers=1, host_limit=1)
+    for job_id, priority in ((1, 3), (2, 1), (3, 2), (4, 1)):
+        scheduler.submit({"id": job_id, "host": "a"}, priority)
+
+    assert scheduler.run(lambda job: [job["id"]]) == [2, 4, 3, 1]
+
+
+def test_newest_jobs_get_the_highest_priority(cli):
+    jobs = [
+        {"date": "2024-02-01T20:00:00Z"},
+        {"date": None},
+        {"date": "15/03/2024 20:00"},
+    ]
+    ranked = sorted(jobs, key=lambda job: cli.job_priority(job, "newest"))
+
+    assert [job["date"] for job in ranked] == [
+        "15/03/2024 20:00",
+        "2024-02-01T20:00:00Z",
+        None,
+    ]
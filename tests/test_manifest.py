@@ -0,0 +1,134 @@
+import pytest
+
+MPD = """<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" mediaPresentationDuration="{duration}">
+  <BaseURL>https://cdn.example/media/</BaseURL>
+  <Period{period}>
+    <BaseURL>periode/</BaseURL>
+    <AdaptationSet mimeType="video/mp4">
+      <BaseURL>video/</BaseURL>
+      <SegmentTemplate timescale="{timescale}" {template}>{timeline}</SegmentTemplate>
+      <Representation id="v1" bandwidth="800000" width="1280" height="720">
+        <BaseURL>{rep_base}</BaseURL>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+
+def video_rep(
+    cli,
+    template,
+    timeline="",
+    timescale=1000,
+    duration="PT10S",
+    period="",
+    rep_base="v1/",
+):
+    xml = MPD.format(
+        duration=duration,
+        period=period,
+        timescale=timescale,
+        template=template,
+        timeline=timeline,
+        rep_base=rep_base,
+    )
+    manifest = cli.parse_manifest(xml, "https://www.example/manifest.mpd")
+    assert len(manifest["video"]) == 1
+    return manifest["video"][0]
+
+
+def test_nested_base_urls_are_resolved(cli):
+    rep = video_rep(
+        cli,
+        'initialization="$RepresentationID$/init.mp4" media="seg-$Number$.m4s" duration="2000"',
+    )
+    init, urls = cli.segment_urls(rep)
+
+    assert init == "https://cdn.example/media/periode/video/v1/v1/init.mp4"
+    assert urls[0] == "https://cdn.example/media/periode/video/v1/seg-0.m4s"
+
+
+def test_absolute_representation_base_url_wins(cli):
+    rep = video_rep(
+        cli,
+        'media="seg-$Number$.m4s" duration="2000"',
+        rep_base="https://altre.example/v1/",
+    )
+
+    assert cli.segment_urls(rep)[1][0] == "https://altre.example/v1/seg-0.m4s"
+
+
+def test_start_number_defaults_to_zero(cli):
+    rep = video_rep(cli, 'media="seg-$Number$.m4s" duration="2000"')
+    _, urls = cli.segment_urls(rep)
+
+    assert [url.rsplit("/", 1)[1] for url in urls] == [f"seg-{n}.m4s" for n in range(5)]
+
+
+def test_number_width_and_start_number(cli):
+    rep = video_rep(cli, 'media="seg-$Number%05d$.m4s" startNumber="7" duration="3000"')
+    _, urls = cli.segment_urls(rep)
+
+    assert [url.rsplit("/", 1)[1] for url in urls] == [
+        "seg-00007.m4s",
+        "seg-00008.m4s",
+        "seg-00009.m4s",
+        "seg-00010.m4s",
+    ]
+
+
+def test_time_template_follows_timeline(cli):
+    rep = video_rep(
+        cli,
+        'media="$RepresentationID$-$Time$.m4s"',
+        '<SegmentTimeline><S t="100" d="4000" r="1"/><S d="2000"/></SegmentTimeline>',
+    )
+    _, urls = cli.segment_urls(rep)
+
+    assert [url.rsplit("/", 1)[1] for url in urls] == [
+        "v1-100.m4s",
+        "v1-4100.m4s",
+        "v1-8100.m4s",
+    ]
+
+
+def test_open_ended_repeat_runs_until_next_entry(cli):
+    rep = video_rep(
+        cli,
+        'media="$Time$.m4s"',
+        '<SegmentTimeline><S t="0" d="2000" r="-1"/><S t="7000" d="1000"/></SegmentTimeline>',
+    )
+
+    assert rep["timeline"] == [[0, 2000, 3], [7000, 1000, 0]]
+    assert [url.rsplit("/", 1)[1] for url in cli.segment_urls(rep)[1]] == [
+        "0.m4s",
+        "2000.m4s",
+        "4000.m4s",
+        "6000.m4s",
+        "7000.m4s",
+    ]
+
+
+def test_open_ended_repeat_runs_until_period_end(cli):
+    rep = video_rep(
+        cli,
+        'media="$Number$.m4s"',
+        '<SegmentTimeline><S t="0" d="3000" r="-1"/></SegmentTimeline>',
+        duration="PT1M",
+        period=' duration="PT10S"',
+    )
+
+    assert rep["timeline"] == [[0, 3000, 3]]
+    assert len(cli.segment_urls(rep)[1]) == 4
+
+
+def test_open_ended_repeat_without_duration_fails(cli):
+    with pytest.raises(Exception, match="SegmentTimeline"):
+        video_rep(
+            cli,
+            'media="$Time$.m4s"',
+            '<SegmentTimeline><S t="0" d="2000" r="-1"/></SegmentTimeline>',
+            duration="",
+        )
@@ -0,0 +1,123 @@
+import io
+import struct
+
+import fake_3cat_server as fake
+import pytest
+
+
+def box(kind, body):
+    return struct.pack(">I", 8 + len(body)) + kind + body
+
+
+def full_box(kind, version, body):
+    return box(kind, struct.pack(">I", version << 24) + body)
+
+
+def init_segment(track_id, movie_timescale, media_timescale, duration, ftyp=True):
+    mvhd = full_box(
+        b"mvhd",
+        0,
+        struct.pack(">IIII", 0, 0, movie_timescale, duration)
+        + bytes(76)
+        + struct.pack(">I", track_id + 1),
+    )
+    tkhd = full_box(
+        b"tkhd", 0, struct.pack(">IIIII", 0, 0, track_id, 0, duration) + bytes(60)
+    )
+    elst = full_box(b"elst", 0, struct.pack(">IIiI", 1, duration, 0, 0x10000))
+    mdhd = full_box(
+        b"mdhd", 0, struct.pack(">IIII", 0, 0, media_timescale, 0) + bytes(4)
+    )
+    trak = box(b"trak", tkhd + box(b"edts", elst) + box(b"mdia", mdhd))
+    trex = full_box(b"trex", 0, struct.pack(">IIIII", track_id, 1, 0, 0, 0))
+    moov = box(b"moov", mvhd + trak + box(b"mvex", trex))
+    header = box(b"ftyp", b"iso5\x00\x00\x00\x00iso5dash") if ftyp else b""
+    return header + moov
+
+
+def parse_tracks(cli, data):
+    moov = cli.find_box(data, (b"moov",))
+    tracks = []
+    for kind, start, body, end in cli.iter_boxes(data, moov[1], moov[2]):
+        if kind != b"trak":
+            continue
+        trak = data[start:end]
+        tkhd = cli.find_box(trak, (b"trak", b"tkhd"))
+        elst = cli.find_box(trak, (b"trak", b"edts", b"elst"))
+        tracks.append(
+            {
+                "id": struct.unpack_from(">I", trak, tkhd[1] + 12)[0],
+                "duration": struct.unpack_from(">I", trak, tkhd[1] + 20)[0],
+                "edit": elst and struct.unpack_from(">I", trak, elst[1] + 8)[0],
+                "timescale": cli.track_timescale(box(b"moov", trak)),
+            }
+        )
+    return tracks
+
+
+def trex_ids(cli, data):
+    mvex = cli.find_box(data, (b"moov", b"mvex"))
+    return [
+        struct.unpack_from(">I", data, body + 4)[0]
+        for kind, _, body, _ in cli.iter_boxes(data, mvex[1], mvex[2])
+        if kind == b"trex"
+    ]
+
+
+def test_merged_init_has_both_tracks(cli):
+    video = init_segment(1, 1000, 90000, 120000)
+    audio = init_segment(1, 1000, 48000, 120500)
+    merged = cli.merge_init_segments(video, audio)
+
+    cli.check_fmp4(merged, init=True)
+    assert merged.startswith(video[: video.index(b"moov") - 4])
+    tracks = parse_tracks(cli, merged)
+    assert [t["id"] for t in tracks] == [1, 2]
+    assert [t["timescale"] for t in tracks] == [90000, 48000]
+    assert trex_ids(cli, merged) == [1, 2]
+
+    mvhd = cli.find_box(merged, (b"moov", b"mvhd"))
+    assert struct.unpack_from(">I", merged, mvhd[2] - 4)[0] == 3
+
+
+def test_audio_edit_list_is_rescaled_to_the_video_movie_timescale(cli):
+    video = init_segment(1, 90000, 90000, 90000 * 120)
+    audio = init_segment(1, 48000, 48000, 48000 * 120)
+    tracks = parse_tracks(cli, cli.merge_init_segments(video, audio))
+
+    assert tracks[0]["duration"] == tracks[0]["edit"] == 90000 * 120
+    assert tracks[1]["duration"] == tracks[1]["edit"] == 90000 * 120
+
+
+@pytest.mark.parametrize("audio_ftyp", [True, False])
+def test_ftyp_is_kept_when_the_video_init_has_none(cli, audio_ftyp):
+    video = init_segment(1, 1000, 90000, 1000, ftyp=False)
+    audio = init_segment(1, 1000, 48000, 1000, ftyp=audio_ftyp)
+    merged = cli.merge_init_segments(video, audio)
+
+    kinds = [kind for kind, _, _, _ in cli.iter_boxes(merged)]
+    assert kinds == [b"ftyp", b"moov"]
+    if audio_ftyp:
+        assert merged.startswith(audio[: audio.index(b"moov") - 4])
+
+
+def test_muxer_interleaves_fragments_by_decode_time(cli):
+    video_rep, audio_rep = fake.REPRESENTATIONS[1], fake.REPRESENTATIONS[2]
+    out = io.BytesIO()
+    muxer = cli.Fmp4Muxer(out)
+    for name, rep in (("video", video_rep), ("audio", audio_rep)):
+        muxer.write(name, fake.init_segment(rep))
+    for number in range(3):
+        muxer.write("video", fake.media_segment(video_rep, number))
+        muxer.write("audio", fake.media_segment(audio_rep, number))
+    muxer.finish("video")
+    muxer.finish("audio")
+
+    data = out.getvalue()
+    track_ids = []
+    for kind, start, body, end in cli.iter_boxes(data):
+        if kind == b"moof":
+            tfhd = cli.find_box(data, (b"traf", b"tfhd"), body, end)
+            track_ids.append(struct.unpack_from(">I", data, tfhd[1] + 4)[0])
+    assert track_ids == [1, 2, 1, 2, 1, 2]
+    assert [t["id"] for t in parse_tracks(cli, data)] == [1, 2]
@@ -0,0 +1,88 @@
+def to_srt(cli, vtt):
+    return "".join(cli.iter_srt_cues(vtt.splitlines(keepends=True)))
+
+
+def test_multi_line_cues_keep_their_lines(cli):
+    vtt = """WEBVTT
+
+00:00:01.000 --> 00:00:03.500
+Primera línia
+<i>segona</i> línia
+
+00:00:04.000 --> 00:00:05.000
+Una sola línia
+"""
+
+    assert to_srt(cli, vtt) == (
+        "1\n00:00:01,000 --> 00:00:03,500\nPrimera línia\nsegona línia\n\n"
+        "2\n00:00:04,000 --> 00:00:05,000\nUna sola línia\n\n"
+    )
+
+
+def test_cue_identifiers_are_dropped_and_cues_renumbered(cli):
+    vtt = """﻿WEBVTT
+
+intro
+00:00:01.000 --> 00:00:02.000
+Hola
+
+7
+00:00:02.000 --> 00:00:03.000 align:start position:10%
+Adéu
+"""
+
+    assert to_srt(cli, vtt) == (
+        "1\n00:00:01,000 --> 00:00:02,000\nHola\n\n"
+        "2\n00:00:02,000 --> 00:00:03,000\nAdéu\n\n"
+    )
+
+
+def test_note_and_style_blocks_are_skipped(cli):
+    vtt = """WEBVTT
+
+STYLE
+::cue {
+  color: yellow;
+}
+
+NOTE Aquest bloc
+ocupa dues línies
+
+00:00:01.000 --> 00:00:02.000
+Text
+
+NOTE al final
+"""
+
+    assert to_srt(cli, vtt) == "1\n00:00:01,000 --> 00:00:02,000\nText\n\n"
+
+
+def test_timestamps_without_hours(cli):
+    vtt = """WEBVTT
+
+00:01.250 --> 01:02.000
+Curt
+
+59:59.999 --> 01:00:00.000
+Llarg
+"""
+
+    assert to_srt(cli, vtt) == (
+        "1\n00:00:01,250 --> 00:01:02,000\nCurt\n\n"
+        "2\n00:59:59,999 --> 01:00:00,000\nLlarg\n\n"
+    )
+
+
+def test_cues_without_text_are_dropped(cli):
+    vtt = """WEBVTT
+
+00:00:01.000 --> 00:00:02.000
+
+00:00:02.000 --> 00:00:03.000
+<c.yellow></c>
+
+00:00:03.000 --> 00:00:04.000
+Text
+"""
+
+    assert to_srt(cli, vtt) == "1\n00:00:03,000 --> 00:00:04,000\nText\n\n"